@@ -0,0 +1,134 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+# Token bucket defaults (requests per second and burst size), each can be overridden by an environment variable.
+# A rate of 0 turns that limit off. Buckets live in process memory, so every worker process enforces its own
+# limits: with N processes the host admits up to N times SLEEP_IP_RATE per address and N times SLEEP_GLOBAL_RATE
+# overall, and SLEEP_GLOBAL_RATE should be the upstream's budget divided by N.
+DEFAULT_SESSION_RATE = 0.1
+DEFAULT_SESSION_BURST = 3
+DEFAULT_IP_RATE = 0.5
+DEFAULT_IP_BURST = 10
+DEFAULT_GLOBAL_RATE = 1.0
+DEFAULT_GLOBAL_BURST = 16
+# Buckets kept for sessions and addresses; the least recently used are forgotten first
+DEFAULT_MAX_BUCKETS = 10000
+
+
+def trust_forwarded_for():
+    """Behind a reverse proxy, SLEEP_TRUST_FORWARDED=1 takes the client address from X-Forwarded-For."""
+    return os.environ.get("SLEEP_TRUST_FORWARDED", "").lower() in ("1", "true", "yes")
+
+
+class ThrottledError(Exception):
+    """Raised instead of calling the webhook when a rate limit has no tokens left.
+
+    ``scope`` is the limit that refused ("session", "ip" or "global") and
+    ``retry_after`` the seconds until a request would be admitted again.
+    """
+
+    def __init__(self, scope, retry_after):
+        super().__init__(f"{scope} rate limit reached, retry in {retry_after:.1f} s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Holds up to ``burst`` tokens, refilled at ``rate`` tokens per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Refill up to ``now`` and return the seconds until one token is available."""
+        # A caller's clock reading may predate the last refill; time never runs backwards for the bucket
+        if now > self._updated:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Admits webhook calls against per-session, per-IP and global token buckets.
+
+    A call is admitted only if every applicable bucket has a token, and
+    then takes one from each; a refused call takes none, so hammering a
+    limit does not push the retry time further out. Callers only ask for
+    admission for calls that would reach the upstream, which leaves cache
+    hits and other locally served answers outside the budget. The
+    "global" limit is per process, not shared with other worker processes.
+    """
+
+    def __init__(self, session_rate=DEFAULT_SESSION_RATE, session_burst=DEFAULT_SESSION_BURST,
+                 ip_rate=DEFAULT_IP_RATE, ip_burst=DEFAULT_IP_BURST, global_rate=DEFAULT_GLOBAL_RATE,
+                 global_burst=DEFAULT_GLOBAL_BURST, max_buckets=DEFAULT_MAX_BUCKETS):
+        self.limits = {
+            "session": (session_rate, session_burst),
+            "ip": (ip_rate, ip_burst),
+            "global": (global_rate, global_burst),
+        }
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            session_rate=float(os.environ.get("SLEEP_SESSION_RATE", DEFAULT_SESSION_RATE)),
+            session_burst=int(os.environ.get("SLEEP_SESSION_BURST", DEFAULT_SESSION_BURST)),
+            ip_rate=float(os.environ.get("SLEEP_IP_RATE", DEFAULT_IP_RATE)),
+            ip_burst=int(os.environ.get("SLEEP_IP_BURST", DEFAULT_IP_BURST)),
+            global_rate=float(os.environ.get("SLEEP_GLOBAL_RATE", DEFAULT_GLOBAL_RATE)),
+            global_burst=int(os.environ.get("SLEEP_GLOBAL_BURST", DEFAULT_GLOBAL_BURST)),
+            max_buckets=int(os.environ.get("SLEEP_ADMISSION_MAX_BUCKETS", DEFAULT_MAX_BUCKETS)),
+        )
+
+    def _bucket(self, scope, key):
+        rate, burst = self.limits[scope]
+        if rate <= 0 or key is None:
+            return None
+        bucket = self._buckets.get((scope, key))
+        if bucket is None:
+            bucket = self._buckets[(scope, key)] = TokenBucket(rate, max(burst, 1))
+            # A forgotten bucket comes back full, which is what an idle one would have refilled to anyway
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end((scope, key))
+        return bucket
+
+    def admit(self, session_id, ip=None):
+        """Take a token from every bucket that applies, or raise ThrottledError without taking any."""
+        with self._lock:
+            now = time.monotonic()
+            buckets = []
+            for scope, key in (("session", session_id), ("ip", ip), ("global", "")):
+                bucket = self._bucket(scope, key)
+                if bucket is not None:
+                    buckets.append((scope, bucket))
+            # The limit that frees up last decides when to come back
+            retry_after, scope = max(((bucket.wait_time(now), scope) for scope, bucket in buckets), default=(0.0, None))
+            if retry_after > 0:
+                metrics.inc(f"admission_throttled_{scope}")
+                raise ThrottledError(scope, retry_after)
+            for _, bucket in buckets:
+                bucket.tokens -= 1
+        metrics.inc("admission_admitted")
+
+    def stats(self):
+        with self._lock:
+            global_bucket = self._buckets.get(("global", ""))
+            return {
+                "buckets": len(self._buckets),
+                "global_tokens": math.floor(global_bucket.tokens) if global_bucket is not None else None,
+            }
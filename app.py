@@ -1,252 +1,519 @@
 import streamlit as st
-import requests
-import json
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import os
 import re
+import math
 import time
-import base64
-import threading
+from functools import partial
+
+import metrics
+from admission import AdmissionController, ThrottledError, trust_forwarded_for
+from audio_proxy import AudioProxy, audio_proxy_enabled, extract_drive_ids
+from history import AnalysisHistory, input_hash
+from job_store import job_store_from_env, wait_for_claim, wait_for_job
+from jobs import JobCancelled, JobQueue, QueueFullError
+from local_analyzer import THEMES, LocalAnalyzer, local_fallback_enabled, local_preview_enabled
+from locales import LANGUAGE_NAMES, load_catalog, resolve_locale
+from progress import LatencyEstimator, display_eta
+from resilience import CircuitBreaker, CircuitOpenError, Hedger, hedging_enabled
+from result_cache import ResultCache, cache_key
+from warmup import PresetWarmer, warmup_enabled
+from webhook import (SECONDARY_WEBHOOK_URL, WebhookHTTPError, WebhookParseError, WebhookResponseTooLarge,
+                     build_session_from_env, fetch_analysis, pool_stats, stream_analysis, streaming_enabled)
+
+# Start timing this script run
+rerun_started = time.perf_counter()
+
+# Resolve the session's locale: language picker first, then ?lang=, then the default
+if 'locale' not in st.session_state:
+    st.session_state.locale = resolve_locale(st.query_params.get("lang"))
+
+# Identifies this browser session to the shared job queue
+SESSION_ID = get_script_run_ctx().session_id
+
+# Locale used for all UI strings and as part of the result cache key
+LOCALE = st.session_state.locale
+t = load_catalog(LOCALE)
 
 # Set page configuration
 st.set_page_config(
-    page_title="Sleep Assistant Helper",
+    page_title=t["page_title"],
     layout="wide",
     initial_sidebar_state="collapsed"
 )
 
-# Custom CSS to improve display on mobile devices
-st.markdown("""
-<style>
-    body {
-        font-family: "Arial", sans-serif;
-    }
-    .stTextArea textarea {
-        font-size: 1rem;
-    }
-    .stButton button {
-        width: 100%;
-        font-size: 1rem;
-        padding: 0.5rem 1rem;
-        margin-top: 0.5rem;
-        background-color: #0abab5 !important;
-    }
-    .result-area {
-        white-space: pre-wrap;
-        border: 1px solid #bfe8e5;
-        border-radius: 5px;
-        padding: 10px;
-        background-color: #f0f8f7;
-        min-height: 100px;
-    }
-    audio {
-        width: 100%;
-    }
-    
-    /* Add more styles for Tiffany green theme */
-    .stProgress > div > div {
-        background-color: #0abab5 !important;
-    }
-    h1, h2, h3 {
-        color: #0abab5 !important;
-    }
-    .stAlert {
-        background-color: #e6f7f6 !important;
-        border-left-color: #0abab5 !important;
-    }
-    
-    /* Mobile responsive design */
-    @media (max-width: 768px) {
-        .stTextArea textarea {
-            font-size: 0.9rem;
-        }
-        h1, h2, h3 {
-            font-size: 1.5rem !important;
-        }
-        iframe {
-            height: 80px !important;
-        }
-    }
-    
-    /* Custom button styles, especially for mobile devices */
-    .custom-button {
-        display: inline-block;
-        background-color: #0abab5;
-        color: white !important;
-        padding: 8px 16px;
-        text-decoration: none;
-        border-radius: 4px;
-        text-align: center;
-        width: 100%;
-        box-sizing: border-box;
-        font-weight: bold;
-        margin: 5px 0;
-    }
-    .download-button {
-        background-color: #2c3e50;
-    }
-    
-    /* Preset option button styles */
-    .preset-option {
-        background-color: #f0f8f7;
-        border: 1px solid #0abab5;
-        border-radius: 5px;
-        padding: 10px;
-        margin: 5px 0;
-        cursor: pointer;
-        transition: all 0.3s;
-    }
-    .preset-option:hover {
-        background-color: #e6f7f6;
-        transform: translateY(-2px);
-    }
-    .preset-option h4 {
-        margin: 0;
-        color: #0abab5;
-    }
-    .preset-option p {
-        margin: 5px 0 0 0;
-        font-size: 0.9rem;
-        color: #333;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Process-wide result cache shared by all sessions and reruns
+@st.cache_resource
+def get_result_cache():
+    cache = ResultCache.from_env()
+    # Presets are the inputs users most often tweak, and their results may already be on disk
+    for locale in LANGUAGE_NAMES:
+        for preset in load_catalog(locale)["presets"].values():
+            cache.index(preset, locale)
+    return cache
+
+# Process-wide keep-alive HTTP session with a bounded connection pool
+@st.cache_resource
+def get_http_session():
+    return build_session_from_env()
+
+# Whether a browser session is still connected; jobs only its closed sessions wanted are cancelled
+def session_is_active(session_id):
+    return not runtime.exists() or runtime.get_instance().is_active_session(session_id)
+
+# Address of the browser behind a session, for the per-IP rate limit
+def client_ip(session_id):
+    client = runtime.get_instance().get_client(session_id) if runtime.exists() else None
+    request = getattr(client, "request", None)
+    if request is None:
+        return None
+    forwarded = request.headers.get("X-Forwarded-For") if trust_forwarded_for() else None
+    return forwarded.split(",")[0].strip() if forwarded else request.remote_ip
+
+# Process-wide worker pool with a bounded job queue
+@st.cache_resource
+def get_job_queue():
+    return JobQueue.from_env(is_alive=session_is_active)
+
+# Submitted analyses and their results, so a reloaded page can reattach via ?job=<id>
+@st.cache_resource
+def get_job_store():
+    return job_store_from_env()
+
+# Local audio proxy that caches Drive tracks on disk and serves Range requests (SLEEP_AUDIO_PROXY=1)
+@st.cache_resource
+def get_audio_proxy():
+    return AudioProxy.from_env(session=get_http_session()).start()
+
+# Rolling window of real webhook latencies that drives the progress bar and ETA
+@st.cache_resource
+def get_latency_estimator():
+    return LatencyEstimator.from_env()
+
+# Process-wide circuit breaker that fails fast while the webhook is down
+@st.cache_resource
+def get_circuit_breaker():
+    return CircuitBreaker.from_env()
+
+# Keyword-based analyzer that answers instantly when the webhook cannot
+@st.cache_resource
+def get_local_analyzer():
+    return LocalAnalyzer.from_env()
+
+# Sends a backup request once an analysis is slower than usual (SLEEP_HEDGE=1)
+@st.cache_resource
+def get_hedger():
+    return Hedger.from_env(get_latency_estimator())
+
+# Per-session, per-IP and global token buckets in front of the webhook (SLEEP_*_RATE, SLEEP_*_BURST)
+@st.cache_resource
+def get_admission_controller():
+    return AdmissionController.from_env()
+
+# Past analyses of every session, compressed and capped per session and in total (SLEEP_HISTORY_*)
+@st.cache_resource
+def get_analysis_history():
+    return AnalysisHistory.from_env()
+
+# Optional Prometheus-style metrics endpoint at http://127.0.0.1:<port>/metrics (SLEEP_METRICS_PORT); each further
+# worker process serves its own metrics on the next free port
+@st.cache_resource
+def start_metrics_server(port):
+    return metrics.start_server(port)
+
+if os.environ.get("SLEEP_METRICS_PORT"):
+    start_metrics_server(int(os.environ["SLEEP_METRICS_PORT"]))
+
+# Page stylesheet, read once per process; mobile layout and Tiffany green theme plus the locale's font
+@st.cache_resource
+def load_page_style(font_family):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "app.css"), encoding="utf-8") as f:
+        css = f.read()
+    return f"<style>\n{css}body {{ font-family: {font_family}; }}\n</style>"
+
+st.markdown(load_page_style(t["font_family"]), unsafe_allow_html=True)
 
 # Title
-st.title("Sleep Assistant Helper")
+st.title(t["title"])
+
+# Language picker, kept in the URL so links and refreshes keep the language
+language = st.selectbox(
+    t["language_label"],
+    options=list(LANGUAGE_NAMES.values()),
+    index=list(LANGUAGE_NAMES).index(LOCALE)
+)
+selected_locale = next(code for code, name in LANGUAGE_NAMES.items() if name == language)
+if selected_locale != LOCALE:
+    st.session_state.locale = selected_locale
+    st.query_params["lang"] = selected_locale
+    st.rerun()
 
 # Define preset options
-preset_options = {
-    "Insomnia & Irritability": "I've been having trouble sleeping lately. I toss and turn in bed for at least an hour before falling asleep, and even when I do sleep, I wake up easily. My sleep quality feels poor, I'm sluggish during the day, and it's hard to concentrate. Emotionally, I feel very irritable and get angry over small things.",
-    "Stress & Anxiety": "Work stress is overwhelming. At night, my mind keeps racing with thoughts and I can't relax. I often dream about work-related things and wake up feeling exhausted. I get nervous and anxious easily. Sometimes my heart rate suddenly increases and I feel short of breath. I really need something slow and soothing.",
-    "Light Sleep & Dreams with Sadness": "I have a highly sensitive personality and prefer quiet environments without any instruments. I sleep very lightly and have many dreams. I wake up at the slightest sound and never feel truly rested. I'm still tired when I wake up in the morning. This has been going on for several months now, and I'm starting to feel emotionally down and lost, losing interest in things I usually enjoy.",
-    "Irregular Schedule & Mood Swings": "Recently, due to overtime and changes in my daily routine, my schedule has become completely irregular. Sometimes I sleep at 3 AM, sometimes I don't wake up until afternoon. I feel like my biological clock is completely disrupted. My emotions fluctuate greatly - sometimes happy, sometimes sad - and it's hard to control my feelings.",
-    "Fatigue & Need for Peace": "My body is very tired, but when I lie down, I become mentally alert and can't fall asleep. Even when I force myself to sleep, I don't get enough sleep time and feel exhausted during the day. I desperately long to find inner peace and hope for a good night's sleep."
-}
+preset_options = t["presets"]
+
+# Preset buttons of each locale split over the two columns, built once per process
+@st.cache_resource
+def preset_columns(locale):
+    items = list(enumerate(load_catalog(locale)["presets"].items()))
+    # First three options in the first column, the last two in the second
+    return items[:3], items[3:]
+
+# Optionally warm the preset results of every locale in the background once per process (SLEEP_WARMUP=1)
+@st.cache_resource
+def start_preset_warmup(locale):
+    return PresetWarmer.from_env(
+        get_result_cache(), load_catalog(locale)["presets"].values(), locale,
+        fetch=partial(fetch_analysis, session=get_http_session()),
+    ).start()
+
+if warmup_enabled():
+    for locale in LANGUAGE_NAMES:
+        start_preset_warmup(locale)
+
+# After a refresh or reconnect, reattach to the analysis named in the URL
+if 'pending_job' not in st.session_state:
+    st.session_state.pending_job = None
+    job_id = st.query_params.get("job")
+    job_store = get_job_store()
+    stored = job_store.get(job_id) if job_id else None
+    if stored is not None:
+        st.session_state.user_input = st.session_state.text_input = stored["user_input"]
+        # Still queued or running in this process: wait for it again; already finished: show the stored result
+        st.session_state.pending_job = get_job_queue().attach(job_id, SESSION_ID)
+        if st.session_state.pending_job is None and stored["state"] == "done":
+            st.session_state.restored_result = stored["result"]
+        elif st.session_state.pending_job is None and stored["state"] == "pending":
+            # Running in another worker process: follow it through the shared store
+            try:
+                st.session_state.pending_job = get_job_queue().submit(
+                    lambda job: wait_for_job(job_store, job_id, cancelled=job.cancelled),
+                    key=f"job:{job_id}", watcher=SESSION_ID,
+                )
+            except QueueFullError:
+                st.session_state.restored_result = {"result": t["busy"], "error": True}
 
 # User input section
-st.header("Please describe your sleep situation:")
+st.header(t["input_header"])
 
 # Preset options section
-st.subheader("Or choose from these common sleep issues:")
+st.subheader(t["presets_subheader"])
 
 # Store selected preset value
 if 'selected_preset' not in st.session_state:
     st.session_state.selected_preset = None
 
-# Create two-column layout
-col1, col2 = st.columns(2)
+# Last submitted input; the text box itself keeps its value in st.session_state.text_input
+if 'user_input' not in st.session_state:
+    st.session_state.user_input = ""
 
-# First three options in first column
-with col1:
-    for i, (title, content) in enumerate(list(preset_options.items())[:3]):
-        if st.button(f"{title}", key=f"preset_{i}"):
-            st.session_state.selected_preset = content
+# Streamlit 1.33 holds a fragment's rerun until the script run in progress ends, so while this session waits
+# for an analysis both sections run as part of the page: a click or an edit then interrupts the wait, and the
+# rerun picks it up again. Otherwise each section reruns on its own.
+def section(fn):
+    if st.session_state.pending_job is None:
+        return st.experimental_fragment(fn)
 
-# Last two options in second column
-with col2:
-    for i, (title, content) in enumerate(list(preset_options.items())[3:]):
-        if st.button(f"{title}", key=f"preset_{i+3}"):
-            st.session_state.selected_preset = content
+    # Drawn into a container like a fragment is, so switching between the two keeps every element in place
+    def in_container():
+        with st.container():
+            fn()
+    return in_container
 
-# Text input area - use session_state to maintain value
-if 'user_input' not in st.session_state:
-    st.session_state.user_input = ""
+# Preset buttons and the input box; a click or an edit does not redraw the rest of the page
+def input_section():
+    fragment_started = time.perf_counter()
 
-# If preset option is selected, update input box
-if st.session_state.selected_preset:
-    st.session_state.user_input = st.session_state.selected_preset
-    # Clear after use to avoid repeated setting
-    st.session_state.selected_preset = None
+    # Create two-column layout
+    for column, presets in zip(st.columns(2), preset_columns(LOCALE)):
+        with column:
+            for i, (title, content) in presets:
+                if st.button(f"{title}", key=f"preset_{i}"):
+                    st.session_state.selected_preset = content
 
-user_input = st.text_area(
-    label="",
-    value=st.session_state.user_input,
-    placeholder="For example: I've only been sleeping 5 hours lately...",
-    height=150,
-    key="text_input"
-)
+    # If preset option is selected, update input box; setting the widget's own state keeps its id,
+    # so text typed after a submit is not thrown away with a re-created widget
+    if st.session_state.selected_preset:
+        st.session_state.text_input = st.session_state.selected_preset
+        # Clear after use to avoid repeated setting
+        st.session_state.selected_preset = None
+
+    st.text_area(
+        label="",
+        placeholder=t["input_placeholder"],
+        height=150,
+        key="text_input"
+    )
+    metrics.observe("input_fragment", time.perf_counter() - fragment_started)
+
+section(input_section)()
+
+# Submit button, progress display and results; showing a result never reruns the input section above
+def analysis_section():
+    fragment_started = time.perf_counter()
+
+    # Analysis job this session is waiting for; it survives reruns so a result that arrives late still shows up
+    job = st.session_state.pending_job
+    # Whether this run of the section is part of a whole-page run, see section()
+    waiting = job is not None
+    job_queue = get_job_queue()
+    audio_proxy = get_audio_proxy() if audio_proxy_enabled() else None
+    data = st.session_state.pop("restored_result", None)
+    # A result restored after a reload, or carried over from the last whole-page run, is already in the history
+    restored = data is not None
+
+    # Submit button and processing logic
+    submitted = st.button(t["submit"])
+    if submitted:
+        # Save current input to session_state; the input fragment may not have rerun since the last edit
+        user_input = st.session_state.text_input
+        st.session_state.user_input = user_input
+        
+        if not user_input.strip():
+            st.error(t["empty_input"])
+        else:
+            # A new submit supersedes the job this session was waiting for, and the result shown before
+            previous_job, job = job, None
+            restored = False
+            st.session_state.pop("restored_entry", None)
+            st.session_state.pop("local_preview", None)
+            result_cache = get_result_cache()
+            http_session = get_http_session()
+            job_store = get_job_store()
+            circuit_breaker = get_circuit_breaker()
+            hedger = get_hedger() if hedging_enabled() else None
+            local_analyzer = get_local_analyzer()
+
+            # Start downloading every linked track as soon as a payload is available, in parallel with rendering
+            def prefetch_audio(data):
+                if audio_proxy is not None and isinstance(data, dict):
+                    with metrics.timer("drive_link_extraction"):
+                        file_ids = extract_drive_ids(str(data.get("result", "")))
+                    audio_proxy.cache.prefetch(file_ids)
+
+            # Local keyword analysis, linking the track of the matching preset's cached analysis
+            def local_result():
+                theme = local_analyzer.classify(user_input)
+                preset = result_cache.get(list(preset_options.values())[THEMES.index(theme)], LOCALE, allow_stale=True)
+                track_ids = extract_drive_ids(str(preset.get("result", ""))) if isinstance(preset, dict) else []
+                return local_analyzer.analyze(user_input, LOCALE, theme=theme, track_id=track_ids[0] if track_ids else None)
+
+            # When the webhook cannot answer, serve an expired cached analysis or the local one, explaining why
+            def fallback_result(reason):
+                stale = result_cache.get(user_input, LOCALE, allow_stale=True)
+                if stale is not None:
+                    return dict(stale, source="stale", reason=reason)
+                if local_fallback_enabled():
+                    return dict(local_result(), reason=reason)
+                return {"result": reason, "error": True}
 
-# Submit button and processing logic
-if st.button("Submit Analysis"):
-    # Save current input to session_state
-    st.session_state.user_input = user_input
-    
-    if not user_input.strip():
-        st.error("⚠️ Please enter some content before submitting!")
-    else:
+            # Look up the cache first; a hit skips the progress display entirely
+            data = result_cache.get(user_input, LOCALE)
+            if data is None and circuit_breaker.is_open():
+                # Fail fast instead of queueing behind a known-bad upstream
+                data = fallback_result(t["upstream_unavailable"])
+            prefetch_audio(data)
+
+            if data is None:
+                latency_estimator = get_latency_estimator()
+
+                # Function to send API request
+                def send_request(job):
+                    # Log sampled stacks for analyses slower than SLEEP_PROFILE_SLOW_SECONDS
+                    with metrics.profile_if_slow("analysis"):
+                        fetch_started = time.perf_counter()
+                        try:
+                            if streaming_enabled():
+                                # Publish partial text so waiting sessions can render it as it arrives
+                                data = circuit_breaker.call(stream_analysis, user_input, job.publish, session=http_session)
+                            elif hedger is not None:
+                                # Race a second attempt (or the secondary endpoint) against a slow first one
+                                data = circuit_breaker.call(
+                                    hedger.run,
+                                    partial(fetch_analysis, user_input, session=http_session),
+                                    partial(fetch_analysis, user_input, session=http_session,
+                                            url=SECONDARY_WEBHOOK_URL or None),
+                                )
+                            else:
+                                data = circuit_breaker.call(fetch_analysis, user_input, session=http_session)
+                        except JobCancelled:
+                            # Nobody is waiting for this analysis any more
+                            raise
+                        except CircuitOpenError:
+                            return fallback_result(t["upstream_unavailable"])
+                        except WebhookParseError as e:
+                            return {"result": t["parse_error"].format(text=e.text), "error": True}
+                        except WebhookResponseTooLarge:
+                            return fallback_result(t["response_too_large"])
+                        except WebhookHTTPError as e:
+                            return fallback_result(t["http_error"].format(status_code=e.status_code))
+                        except Exception as e:
+                            return fallback_result(t["request_failed"].format(error=str(e)))
+                        latency_estimator.record(time.perf_counter() - fetch_started)
+                        prefetch_audio(data)
+                        # Only cache successfully parsed results
+                        result_cache.put(user_input, LOCALE, data)
+                        return data
+            
+                # Record the outcome so a reloaded page can still show it
+                def run_job(job):
+                    # The worker may get here before the submitting script records the job
+                    job_store.create(job.id, user_input, LOCALE)
+                    try:
+                        # Another worker process may already be analyzing this input; share its result if so
+                        data = wait_for_claim(job_store, job.key, job.id, cancelled=job.cancelled)
+                        if data is not None:
+                            metrics.inc("jobs_shared")
+                        else:
+                            data = send_request(job)
+                    except JobCancelled:
+                        job_store.finish(job.id, None, state="cancelled")
+                        raise
+                    job_store.finish(job.id, data)
+                    return data
+
+                # Submit the request to the shared worker pool
+                try:
+                    # Identical concurrent inputs share one upstream call; only a new call spends rate limit tokens
+                    job = job_queue.submit(
+                        run_job, key=cache_key(user_input, LOCALE), watcher=SESSION_ID,
+                        admit=partial(get_admission_controller().admit, SESSION_ID, client_ip(SESSION_ID)),
+                    )
+                except QueueFullError:
+                    data = {"result": t["busy"], "error": True}
+                except ThrottledError as e:
+                    # Answer right away from local data, saying when a full analysis can be requested again
+                    message = t["throttled_global"] if e.scope == "global" else t["throttled"]
+                    data = fallback_result(message.format(seconds=math.ceil(e.retry_after)))
+                else:
+                    job_store.create(job.id, user_input, LOCALE)
+
+            # The superseded job is cancelled unless another session is still waiting for it
+            if previous_job is not None and previous_job is not job:
+                job_queue.release(previous_job, SESSION_ID)
+            st.session_state.pending_job = job
+            # Keep the job id in the URL so a refresh reattaches to it
+            if job is not None:
+                st.query_params["job"] = job.id
+                # Show the instant local analysis as a first answer until the real one arrives (SLEEP_LOCAL_PREVIEW=1)
+                if local_preview_enabled():
+                    st.session_state.local_preview = local_result()["result"]
+                # Redraw the whole page, so the input section stops running as a fragment while the job is awaited
+                if not waiting:
+                    st.rerun()
+            elif "job" in st.query_params:
+                del st.query_params["job"]
+
+    # Wait for this session's job, whether it was just submitted or is still running from before a rerun
+    if data is None and job is not None:
         # Create placeholders for progress display
         progress_placeholder = st.empty()
         status_placeholder = st.empty()
-        
-        # Display countdown timer during analysis
-        counter = 100
+
+        # Progress and ETA are estimated from recently observed webhook latencies
+        latency_estimator = get_latency_estimator()
+        # Progress redraw interval in seconds; completion wakes the loop immediately
+        redraw_interval = 1.0
         progress_bar = st.progress(0)
-        
-        # Function to send API request
-        def send_request():
-            try:
-                response = requests.post(
-                    "https://sleep.zeabur.app/webhook/c8f29e8a-3796-43f8-940a-23b061039ff2",
-                    headers={"Content-Type": "application/json"},
-                    json={"user_input": user_input},
-                    timeout=95
-                )
-                
-                if response.status_code == 200:
-                    try:
-                        return response.json()
-                    except json.JSONDecodeError:
-                        try:
-                            return json.loads(response.text)
-                        except:
-                            return {"result": f"⚠️ Unable to parse response content:\n\n{response.text}"}
+        # Placeholder for partial results when streaming is enabled
+        stream_placeholder = st.empty()
+
+        # Local preview recorded on submit, drawn again by every rerun while waiting
+        preview = st.session_state.get("local_preview")
+        if preview is not None:
+            with stream_placeholder.container():
+                st.info(t["local_notice"])
+                st.markdown(f"<div class='result-area'>{preview}</div>", unsafe_allow_html=True)
+
+        # Show the queue position while waiting, then the estimated progress once a worker picks the job up
+        version = 0
+        shown = None
+        next_redraw = time.monotonic()
+        while not job.done():
+            if time.monotonic() >= next_redraw:
+                next_redraw = time.monotonic() + redraw_interval
+                # Streamlit only stops a run for a rerun request at its own calls, and the display may not change
+                # for a long time; touching the session state is enough for a click to interrupt the wait
+                st.session_state.get("pending_job")
+                position = job_queue.position(job)
+                if position:
+                    display = ("queued", position)
                 else:
-                    return {"result": f"❌ Server response error: HTTP code {response.status_code}"}
-            except Exception as e:
-                return {"result": f"❌ Failed to send request. Please check network or server status\n{str(e)}"}
-        
-        # Execute request in background
-        result = {"data": None}
-        
-        def background_request():
-            result["data"] = send_request()
-        
-        thread = threading.Thread(target=background_request)
-        thread.start()
-        
-        # Update countdown timer with actual countdown
-        for i in range(counter):
-            if not thread.is_alive() and result["data"] is not None:
-                # Request completed, can exit loop
-                progress_placeholder.markdown(f"🧠 Analysis complete!")
-                progress_bar.progress(1.0)
-                break
-                
-            # Update countdown timer and progress bar
-            seconds_left = counter - i
-            progress_placeholder.markdown(f"🧠 Sleep assistant is analyzing, please wait...({seconds_left} seconds)")
-            status_placeholder.info(f"Performing analysis step {i+1}...")
-            progress_bar.progress((i + 1) / counter)
-            
-            # Pause for one second
-            time.sleep(1)
-        
-        # Ensure thread completion
-        thread.join()
-        
+                    elapsed = time.perf_counter() - (job.started_at or time.perf_counter())
+                    progress, eta = latency_estimator.estimate(elapsed)
+                    display = ("running", int(progress * 100), display_eta(eta))
+
+                # Only send updates to the browser when the visible value changes
+                if display != shown:
+                    shown = display
+                    if display[0] == "queued":
+                        # Still waiting for a free worker
+                        progress_placeholder.markdown(t["queued"].format(position=position))
+                        status_placeholder.info(t["queued_info"])
+                    else:
+                        # Update the ETA and progress bar
+                        _, percent, seconds_left = display
+                        if seconds_left is None:
+                            progress_placeholder.markdown(t["analyzing_overdue"])
+                        else:
+                            progress_placeholder.markdown(t["analyzing"].format(seconds_left=seconds_left))
+                        typical = display_eta(latency_estimator.percentile(90))
+                        status_placeholder.info(t["analysis_typical"].format(seconds=typical))
+                        progress_bar.progress(percent / 100)
+
+            # Render streamed text as soon as it arrives
+            if job.version != version:
+                version = job.version
+                stream_placeholder.markdown(f"<div class='result-area'>{job.partial}</div>", unsafe_allow_html=True)
+
+            # Wake on completion or new streamed text, redrawing progress at most once per interval
+            job.wait_for_update(version, max(next_redraw - time.monotonic(), 0))
+
+        # Request completed
+        progress_placeholder.markdown(t["analysis_complete"])
+        progress_bar.progress(1.0)
+
         # Clear progress display
         progress_placeholder.empty()
         status_placeholder.empty()
         progress_bar.empty()
-        
-        # Display results
-        st.header("Analysis Results:")
-        
+        stream_placeholder.empty()
+
         # Check if there are results
-        data = result["data"] if result["data"] is not None else {"result": "❌ Unable to get analysis results, please try again later"}
+        data = job.result if job.result is not None else {"result": t["no_result"], "error": True}
+        st.session_state.pending_job = None
+        st.session_state.pop("local_preview", None)
+
+    # Remember every new analysis so the session can compare it with its earlier ones; stale copies of an
+    # earlier analysis and local keyword answers are only stand-ins, so they are left out
+    history = get_analysis_history()
+    latest = st.session_state.pop("restored_entry", None) if restored else None
+    if (data is not None and not restored and "result" in data and not data.get("error")
+            and data.get("source") not in ("local", "stale")):
+        latest = history.add(
+            SESSION_ID, st.session_state.user_input, LOCALE, str(data["result"]),
+            seconds=time.perf_counter() - (job.submitted_at if job is not None else fragment_started),
+            source=data.get("source"),
+        )
+    if waiting and data is not None:
+        # This run drew the page outside fragments, so the next click reruns all of it; show the result again then
+        st.session_state.restored_result = data
+        st.session_state.restored_entry = latest
+
+    if data is not None:
+        # Display results
+        render_started = time.perf_counter()
+        st.header(t["results_header"])
         
         
         # Check if there are results
         if "result" in data:
+            if data.get("reason"):
+                st.warning(data["reason"])
+            if data.get("source") == "stale":
+                st.info(t["stale_notice"])
+            elif data.get("source") == "local":
+                st.info(t["local_notice"])
             st.markdown(f"<div class='result-area'>{data['result']}</div>", unsafe_allow_html=True)
             
             # Try to extract Google Drive link
@@ -256,11 +523,15 @@ if st.button("Submit Analysis"):
             if match and match.group(1):
                 file_id = match.group(1)
                 
-                st.header("🎧 Sleep Music:")
+                st.header(t["music_header"])
                 
                 # Provide different playback options for desktop and mobile devices
                 # 1. Use HTML5 Audio element (friendly for desktop and some mobile devices)
-                audio_url = f"https://drive.google.com/uc?export=download&id={file_id}"
+                if audio_proxy_enabled():
+                    # Serve the track through the local caching proxy so replays and seeking stay local
+                    audio_url = audio_proxy.url_for(file_id)
+                else:
+                    audio_url = f"https://drive.google.com/uc?export=download&id={file_id}"
                 st.audio(audio_url, format="audio/mp3")
                 
                 # 2. Use iframe to embed Google Drive preview (more mobile-friendly)
@@ -282,7 +553,7 @@ if st.button("Submit Analysis"):
                     style="display:inline-block; background-color:#0abab5; color:white; 
                     padding:8px 16px; text-decoration:none; border-radius:4px; 
                     text-align:center; width:100%; box-sizing:border-box;">
-                    📱 Open in Google Drive</a>
+                    {t["open_in_drive"]}</a>
                     """, unsafe_allow_html=True)
                 
                 with col2:
@@ -292,20 +563,49 @@ if st.button("Submit Analysis"):
                     style="display:inline-block; background-color:#2c3e50; color:white; 
                     padding:8px 16px; text-decoration:none; border-radius:4px; 
                     text-align:center; width:100%; box-sizing:border-box;">
-                    💾 Download Music Directly</a>
+                    {t["download_music"]}</a>
                     """, unsafe_allow_html=True)
                 
                 # Give users some tips
-                st.info("💡 Tip: If the player doesn't work properly, please try 'Open in Google Drive' or 'Download Music Directly' options.")
+                st.info(t["player_tip"])
                 
                     
         else:
-            st.error("No valid analysis results received.")
-else:
-    # Default message displayed when page first loads
-    st.header("Analysis Results:")
-    st.markdown("<div class='result-area'>No analysis submitted yet</div>", unsafe_allow_html=True)
+            st.error(t["invalid_result"])
+        metrics.observe("render", time.perf_counter() - render_started)
+    elif not submitted:
+        # Default message displayed when page first loads
+        st.header(t["results_header"])
+        st.markdown(f"<div class='result-area'>{t['not_submitted']}</div>", unsafe_allow_html=True)
+
+    # Earlier analyses of this session, newest first, marking those of the same description
+    earlier = [entry for entry in history.entries(SESSION_ID) if entry is not latest]
+    if earlier:
+        current_hash = input_hash(st.session_state.user_input, LOCALE)
+        with st.expander(t["history_header"].format(count=len(earlier))):
+            for entry in earlier:
+                label = t["history_entry"].format(
+                    time=time.strftime("%H:%M", time.localtime(entry.created)), seconds=f"{entry.seconds:.1f}"
+                )
+                if entry.input_hash == current_hash:
+                    label += " · " + t["history_same_input"]
+                st.markdown(f"**{label}**")
+                st.markdown(f"<div class='result-area'>{entry.result}</div>", unsafe_allow_html=True)
+    metrics.observe("analysis_fragment", time.perf_counter() - fragment_started)
+
+section(analysis_section)()
+
+# Connection pool statistics for sizing SLEEP_HTTP_POOL_SIZE (SLEEP_SHOW_STATS=1)
+if os.environ.get("SLEEP_SHOW_STATS"):
+    with st.sidebar.expander(t["stats_title"]):
+        st.json(pool_stats(get_http_session()))
+        st.json(get_job_queue().stats())
+        st.json(get_circuit_breaker().stats())
+        st.json(get_analysis_history().stats())
+        st.json(get_admission_controller().stats())
 
 # Footer information
 st.markdown("---")
-st.markdown("© 2025 Sleep Assistant Helper | Developed with Streamlit")
+st.markdown(t["footer"])
+
+metrics.observe("script_rerun", time.perf_counter() - rerun_started)
@@ -0,0 +1,322 @@
+import logging
+import mmap
+import os
+import re
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: downloads are only deduplicated within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc?export=download&id={file_id}"
+DRIVE_LINK_PATTERN = re.compile(r"https://drive\.google\.com/file/d/([a-zA-Z0-9_-]+)/")
+FILE_ID_PATTERN = re.compile(r"^[a-zA-Z0-9_-]+$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Proxy defaults, overridable via SLEEP_AUDIO_* environment variables
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8502
+DEFAULT_CACHE_DIR = os.path.join(".cache", "audio")
+DEFAULT_MAX_MB = 500
+DOWNLOAD_TIMEOUT = 60
+PREFETCH_WORKERS = 2
+CHUNK_SIZE = 64 * 1024
+
+
+def audio_proxy_enabled():
+    """The local audio proxy is opt-in via SLEEP_AUDIO_PROXY=1."""
+    return os.environ.get("SLEEP_AUDIO_PROXY", "").lower() in ("1", "true", "yes")
+
+
+def extract_drive_ids(text):
+    """Return every distinct Drive file id linked in ``text``, in order."""
+    return list(dict.fromkeys(DRIVE_LINK_PATTERN.findall(text or "")))
+
+
+class AudioFetchError(Exception):
+    """Raised when a Drive file cannot be downloaded as audio."""
+
+
+class AudioCache:
+    """Size-bounded on-disk LRU cache of Google Drive audio files.
+
+    Each ``file_id`` is downloaded at most once at a time, also across worker
+    processes sharing ``directory`` (through a lock file per track); recency
+    is tracked through file modification times so eviction survives restarts.
+    Only ids registered with ``allow`` (the tracks analyses linked) are
+    served, and a track larger than the whole cache is refused.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, session=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.session = session or requests.Session()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._prefetching = set()
+        self._prefetcher = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="audio-prefetch")
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, file_id):
+        return os.path.join(self.directory, f"{file_id}.audio")
+
+    def _allowed_path(self, file_id):
+        return os.path.join(self.directory, f"{file_id}.allowed")
+
+    def allow(self, file_ids):
+        """Let the proxy serve ``file_ids``; the marker files are shared with the other worker processes."""
+        for file_id in file_ids:
+            if FILE_ID_PATTERN.match(file_id) and not os.path.exists(self._allowed_path(file_id)):
+                open(self._allowed_path(file_id), "a").close()
+
+    def allowed(self, file_id):
+        return bool(FILE_ID_PATTERN.match(file_id)) and os.path.exists(self._allowed_path(file_id))
+
+    def _lock_for(self, file_id):
+        with self._locks_guard:
+            return self._locks.setdefault(file_id, threading.Lock())
+
+    @contextmanager
+    def _file_lock(self, file_id):
+        # Another process downloading the same track holds this lock until its file is in place
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, f"{file_id}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, file_id):
+        """Return the local path for ``file_id``, downloading it on first use."""
+        if not FILE_ID_PATTERN.match(file_id):
+            raise AudioFetchError(f"invalid file id {file_id!r}")
+        path = self.path(file_id)
+        with self._lock_for(file_id), self._file_lock(file_id):
+            if os.path.exists(path):
+                os.utime(path)
+                return path
+            with metrics.timer("audio_fetch"):
+                self._download(file_id, path)
+        self._evict(keep=os.path.basename(path))
+        return path
+
+    def prefetch(self, file_ids):
+        """Allow ``file_ids`` and start downloading them in the background; never blocks."""
+        self.allow(file_ids)
+        for file_id in file_ids:
+            if os.path.exists(self.path(file_id)):
+                continue
+            with self._locks_guard:
+                if file_id in self._prefetching:
+                    continue
+                self._prefetching.add(file_id)
+            self._prefetcher.submit(self._prefetch_one, file_id)
+
+    def _prefetch_one(self, file_id):
+        try:
+            self.get(file_id)
+        except AudioFetchError as e:
+            logger.info("Audio prefetch of %s failed: %s", file_id, e)
+        finally:
+            with self._locks_guard:
+                self._prefetching.discard(file_id)
+
+    def _download(self, file_id, path):
+        url = DRIVE_DOWNLOAD_URL.format(file_id=file_id)
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        try:
+            with self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                content_type = response.headers.get("Content-Type", "")
+                # Drive answers with an HTML page for missing or non-public files
+                if response.status_code != 200 or content_type.startswith("text/html"):
+                    raise AudioFetchError(f"Drive returned {response.status_code} {content_type}")
+                # A track larger than the whole cache would be evicted as soon as it landed
+                too_large = AudioFetchError(f"{file_id} is larger than the audio cache")
+                if int(response.headers.get("Content-Length") or 0) > self.max_bytes:
+                    raise too_large
+                written = 0
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        written += len(chunk)
+                        if written > self.max_bytes:
+                            raise too_large
+                        f.write(chunk)
+            os.replace(tmp_path, path)
+        except requests.RequestException as e:
+            raise AudioFetchError(str(e)) from e
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".audio"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                # The track just fetched for a request stays; it fits the cache on its own
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def parse_range(header, size):
+    """Translate a single ``bytes=`` Range header into inclusive offsets.
+
+    Returns ``None`` for a missing header and raises ValueError when the range
+    cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise ValueError(header)
+    start, end = match.groups()
+    if start == "":
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+class _AudioRequestHandler(BaseHTTPRequestHandler):
+    cache = None
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        match = re.match(r"^/audio/([a-zA-Z0-9_-]+)$", self.path.split("?", 1)[0])
+        # Only tracks an analysis linked, so the proxy cannot be used to fetch arbitrary Drive files
+        if not match or not self.cache.allowed(match.group(1)):
+            self.send_error(404)
+            return
+        try:
+            path = self.cache.get(match.group(1))
+            f = open(path, "rb")
+        except AudioFetchError as e:
+            logger.warning("Audio proxy fetch failed: %s", e)
+            self.send_error(502)
+            return
+        except FileNotFoundError:
+            # Evicted by another worker process between the download and now
+            logger.warning("Audio proxy file %s disappeared before it was served", path)
+            self.send_error(502)
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            try:
+                byte_range = parse_range(self.headers.get("Range"), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            start, end = byte_range if byte_range else (0, size - 1)
+
+            self.send_response(206 if byte_range else 200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Cache-Control", "public, max-age=86400")
+            self.send_header("Content-Length", str(end - start + 1 if size else 0))
+            if byte_range:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+            if not send_body or size == 0:
+                return
+
+            # Serve straight from the page cache without copying the whole file
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    for offset in range(start, end + 1, CHUNK_SIZE):
+                        self.wfile.write(view[offset:min(offset + CHUNK_SIZE, end + 1)])
+                except (BrokenPipeError, ConnectionResetError):
+                    # Browsers routinely drop connections while seeking
+                    pass
+                finally:
+                    view.release()
+
+    def log_message(self, format, *args):
+        logger.debug("audio proxy: " + format, *args)
+
+
+class _SharedPortHTTPServer(ThreadingHTTPServer):
+    # Every worker process on the host binds the same proxy port and the kernel spreads
+    # connections across them; they all serve the same cache directory
+    def server_bind(self):
+        if hasattr(socket, "SO_REUSEPORT"):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+class AudioProxy:
+    """Local HTTP server that serves cached Drive audio with Range support."""
+
+    def __init__(self, cache, host=DEFAULT_HOST, port=DEFAULT_PORT, public_url=None):
+        self.cache = cache
+        handler = type("AudioRequestHandler", (_AudioRequestHandler,), {"cache": cache})
+        self.server = _SharedPortHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.public_url = (public_url or f"http://{host}:{self.server.server_port}").rstrip("/")
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, session=None):
+        cache = AudioCache(
+            directory=os.environ.get("SLEEP_AUDIO_CACHE_DIR", DEFAULT_CACHE_DIR),
+            max_bytes=int(float(os.environ.get("SLEEP_AUDIO_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+            session=session,
+        )
+        return cls(
+            cache,
+            host=os.environ.get("SLEEP_AUDIO_PROXY_HOST", DEFAULT_HOST),
+            port=int(os.environ.get("SLEEP_AUDIO_PROXY_PORT", DEFAULT_PORT)),
+            public_url=os.environ.get("SLEEP_AUDIO_PUBLIC_URL"),
+        )
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.server.serve_forever, name="audio-proxy", daemon=True)
+            self._thread.start()
+        return self
+
+    def url_for(self, file_id):
+        self.cache.allow([file_id])
+        return f"{self.public_url}/audio/{file_id}"
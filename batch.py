@@ -0,0 +1,184 @@
+"""Run a JSONL file of sleep descriptions through the analysis webhook.
+
+Each input line is a JSON object with ``user_input`` (or ``text``) and
+optionally ``id`` and ``locale``; the line number is the id otherwise.
+Rows are analyzed with bounded concurrency and an optional request rate
+limit, and one JSON line per row (result, Drive ids, timing or error) is
+appended to the output as soon as it finishes. Rerunning with the same
+output file resumes: rows that already succeeded are skipped, failed ones
+are retried.
+
+    python batch.py descriptions.jsonl results.jsonl --concurrency 4 --rate 2
+    python batch.py descriptions.jsonl results.jsonl --populate-cache
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from audio_proxy import extract_drive_ids
+from locales import DEFAULT_LOCALE, resolve_locale
+from result_cache import ResultCache
+from webhook import REQUEST_TIMEOUT, WebhookHTTPError, WebhookParseError, build_session_from_env, fetch_analysis
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        time.sleep(max(slot - now, 0))
+
+
+def read_rows(path):
+    """Yield ``(id, user_input, locale)`` for every usable line of the input file."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                print(f"Skipping line {line_number}: not valid JSON", file=sys.stderr)
+                continue
+            if not isinstance(row, dict):
+                print(f"Skipping line {line_number}: not a JSON object", file=sys.stderr)
+                continue
+            text = row.get("user_input", row.get("text", ""))
+            if not str(text).strip():
+                print(f"Skipping line {line_number}: no user_input", file=sys.stderr)
+                continue
+            yield str(row.get("id", line_number)), str(text), row.get("locale")
+
+
+def finished_ids(path):
+    """Ids of rows that already succeeded in an earlier run's output."""
+    done = set()
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by an interruption; the row runs again
+                    continue
+                if isinstance(record, dict) and "error" not in record and "id" in record:
+                    done.add(str(record["id"]))
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, 2)
+        return f.read(1) == b"\n"
+
+
+def analyze_row(row_id, user_input, locale, session, limiter, cache, timeout):
+    limiter.acquire()
+    record = {"id": row_id, "locale": locale}
+    started = time.perf_counter()
+    try:
+        data = fetch_analysis(user_input, timeout=timeout, session=session)
+    except WebhookHTTPError as e:
+        record["error"] = f"HTTP {e.status_code}"
+    except WebhookParseError as e:
+        record["error"] = "unparseable response"
+        record["raw"] = e.text
+    except Exception as e:
+        record["error"] = str(e) or type(e).__name__
+    else:
+        result = data.get("result") if isinstance(data, dict) else None
+        record["result"] = result
+        record["drive_ids"] = extract_drive_ids(str(result or ""))
+        if cache is not None:
+            cache.put(user_input, locale, data)
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def run(args):
+    done = finished_ids(args.output)
+    session = build_session_from_env()
+    limiter = RateLimiter(args.rate)
+    cache = ResultCache.from_env() if args.populate_cache else None
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    def write(future, out):
+        record = future.result()
+        counts["failed" if "error" in record else "ok"] += 1
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # Every finished row is on disk before the next one, so an interruption loses nothing
+        out.flush()
+
+    pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="batch")
+    pending = set()
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            if out.tell() and not ends_with_newline(args.output):
+                # Start after a line cut short by a crash instead of gluing onto it
+                out.write("\n")
+            try:
+                for row_id, user_input, locale in read_rows(args.input):
+                    if row_id in done:
+                        counts["skipped"] += 1
+                        continue
+                    # Only read ahead a little so huge input files stream through in constant memory
+                    while len(pending) >= args.concurrency * 2:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            write(future, out)
+                    locale = resolve_locale(locale or args.locale)
+                    pending.add(pool.submit(
+                        analyze_row, row_id, user_input, locale, session, limiter, cache, args.timeout
+                    ))
+                    done.add(row_id)
+                for future in wait(pending).done:
+                    write(future, out)
+            except KeyboardInterrupt:
+                # Drop queued rows, keep whatever is already running
+                pool.shutdown(wait=True, cancel_futures=True)
+                for future in pending:
+                    if future.done() and not future.cancelled():
+                        write(future, out)
+                print("Interrupted; rerun the same command to resume.", file=sys.stderr)
+    finally:
+        pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Analyzed {counts['ok']} rows, {counts['failed']} failed, {counts['skipped']} already done"
+        f" in {elapsed:.1f} s ({(counts['ok'] + counts['failed']) / max(elapsed, 1e-9):.2f} rows/s)"
+    )
+    return 1 if counts["failed"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file of sleep descriptions")
+    parser.add_argument("output", help="JSONL file results are appended to; also the resume checkpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="webhook calls in flight at once")
+    parser.add_argument("--rate", type=float, default=0, help="maximum webhook calls per second (0 = unlimited)")
+    parser.add_argument("--locale", default=DEFAULT_LOCALE, help="locale for rows that do not set one")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="per-request timeout in seconds")
+    parser.add_argument("--populate-cache", action="store_true",
+                        help="also store every result in the app's result cache (SLEEP_CACHE_*)")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
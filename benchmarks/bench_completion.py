@@ -0,0 +1,105 @@
+"""Measure how long the result loop takes to notice a finished analysis.
+
+Compares the old ``thread.is_alive()`` + ``time.sleep(1)`` polling loop with
+the event-driven ``job.wait_for_update(version, ...)`` loop used by the app,
+which also wakes for streamed text and redraws progress at most once per
+interval. Each trial runs a fake upstream call with a random duration that
+streams a few chunks, and records the gap between the call returning and
+the waiting loop seeing the result.
+
+    python benchmarks/bench_completion.py --trials 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import JobQueue  # noqa: E402
+
+
+def fake_upstream(duration, finished, job=None, chunks=1):
+    text = ""
+    for i in range(chunks):
+        time.sleep(duration / chunks)
+        text += f"chunk {i} "
+        if job is not None:
+            job.publish(text)
+    finished["at"] = time.perf_counter()
+    return {"result": text}
+
+
+def polling_trial(duration):
+    finished = {}
+    result = {"data": None}
+
+    def background_request():
+        result["data"] = fake_upstream(duration, finished)
+
+    thread = threading.Thread(target=background_request)
+    thread.start()
+    while True:
+        if not thread.is_alive() and result["data"] is not None:
+            break
+        time.sleep(1)
+    return time.perf_counter() - finished["at"]
+
+
+def event_trial(queue, duration, redraw_interval=1.0, chunks=4):
+    finished = {}
+    job = queue.submit(lambda job: fake_upstream(duration, finished, job, chunks))
+    # Same loop as the app's result area, minus the drawing
+    version = 0
+    next_redraw = time.monotonic()
+    while not job.done():
+        if time.monotonic() >= next_redraw:
+            next_redraw = time.monotonic() + redraw_interval
+        if job.version != version:
+            version = job.version
+        job.wait_for_update(version, max(next_redraw - time.monotonic(), 0))
+    return time.perf_counter() - finished["at"]
+
+
+def summarize(name, samples):
+    samples_ms = [s * 1000 for s in samples]
+    print(
+        f"{name:>8}: mean {statistics.mean(samples_ms):7.1f} ms"
+        f"  p50 {statistics.median(samples_ms):7.1f} ms"
+        f"  max {max(samples_ms):7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--min-duration", type=float, default=0.2)
+    parser.add_argument("--max-duration", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    durations = [rng.uniform(args.min_duration, args.max_duration) for _ in range(args.trials)]
+    queue = JobQueue(max_workers=1, max_queued=1)
+
+    # Both variants see the same durations, and run concurrently to halve wall time
+    polling, event = [], []
+    threads = [
+        threading.Thread(target=lambda: polling.extend(polling_trial(d) for d in durations)),
+        threading.Thread(target=lambda: event.extend(event_trial(queue, d) for d in durations)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"Added completion latency over {args.trials} trials:")
+    summarize("polling", polling)
+    summarize("event", event)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Measure what one widget interaction costs with and without fragment reruns.
+
+Drives the app through Streamlit's AppTest: preset clicks, text edits and
+submits of an already cached input. AppTest always reruns the whole
+script, so every interaction is measured as a full-page rerun (the
+``script_rerun`` timer, plus every delta sent to the browser) and the
+share of it that belongs to the fragment holding the widget (its
+``*_fragment`` timer, plus the deltas tagged with its fragment id). Under
+``streamlit run`` that share is all an interaction reruns and resends,
+except while an analysis is pending: the app then runs the whole page.
+
+    python benchmarks/bench_rerun.py --rounds 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_webhook import FakeWebhookConfig, start_fake_webhook  # noqa: E402
+
+# Fragments in the order the app renders them, with the timer each one records
+FRAGMENT_TIMERS = ("input_fragment", "analysis_fragment")
+
+
+def record_runners():
+    """Keep every AppTest script runner so the messages of a run can be inspected afterwards."""
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    runners = []
+
+    class RecordingScriptRunner(LocalScriptRunner):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            runners.append(self)
+
+    app_test.LocalScriptRunner = RecordingScriptRunner
+    return runners
+
+
+def delta_sizes(runner):
+    """``{fragment_id: (deltas, bytes)}`` for the last run; "" holds deltas outside any fragment."""
+    sizes = {}
+    for msg in runner.forward_msgs():
+        if msg.WhichOneof("type") != "delta":
+            continue
+        count, size = sizes.get(msg.delta.fragment_id, (0, 0))
+        sizes[msg.delta.fragment_id] = (count + 1, size + msg.ByteSize())
+    return sizes
+
+
+def timer_mean(before, after, name):
+    count = after["histograms"].get(name, {}).get("count", 0) - before["histograms"].get(name, {}).get("count", 0)
+    total = after["histograms"].get(name, {}).get("sum", 0) - before["histograms"].get(name, {}).get("sum", 0)
+    return total / count if count else float("nan")
+
+
+def measure(at, runners, interact, fragment):
+    """Run one interaction; returns full-page and fragment ``(seconds, deltas, bytes)``."""
+    import metrics
+
+    before = metrics.REGISTRY.snapshot()
+    interact(at)
+    at.run()
+    after = metrics.REGISTRY.snapshot()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    sizes = delta_sizes(runners[-1])
+    fragment_ids = [fragment_id for fragment_id in sizes if fragment_id]
+    fragment_deltas, fragment_bytes = sizes[fragment_ids[FRAGMENT_TIMERS.index(fragment)]]
+    return (
+        (timer_mean(before, after, "script_rerun"),
+         sum(count for count, _ in sizes.values()), sum(size for _, size in sizes.values())),
+        (timer_mean(before, after, fragment), fragment_deltas, fragment_bytes),
+    )
+
+
+def summarize(name, samples):
+    full = [sample[0] for sample in samples]
+    fragment = [sample[1] for sample in samples]
+    full_ms = statistics.mean(s[0] for s in full) * 1000
+    fragment_ms = statistics.mean(s[0] for s in fragment) * 1000
+    full_kib = statistics.mean(s[2] for s in full) / 1024
+    fragment_kib = statistics.mean(s[2] for s in fragment) / 1024
+    print(
+        f"{name:>12}: full page {full_ms:6.2f} ms {statistics.mean(s[1] for s in full):5.1f} deltas"
+        f" {full_kib:6.2f} KiB | fragment {fragment_ms:6.2f} ms {statistics.mean(s[1] for s in fragment):5.1f} deltas"
+        f" {fragment_kib:6.2f} KiB | saved {full_ms - fragment_ms:6.2f} ms {full_kib - fragment_kib:6.2f} KiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20, help="repetitions of each interaction")
+    parser.add_argument("--locale", default="en")
+    args = parser.parse_args()
+
+    server, url = start_fake_webhook(FakeWebhookConfig(latency_mean=0.05))
+    # Configure the app before any of its modules are imported
+    os.environ["SLEEP_WEBHOOK_URL"] = url
+    os.environ.setdefault("SLEEP_CACHE_DIR", tempfile.mkdtemp(prefix="sleep-bench-cache-"))
+
+    import streamlit.logger
+    from streamlit.testing.v1 import AppTest
+
+    from locales import load_catalog
+
+    # AppTest runs outside `streamlit run`, which Streamlit warns about on every session
+    streamlit.logger.set_log_level("error")
+    runners = record_runners()
+    catalog = load_catalog(args.locale)
+    presets = list(catalog["presets"])
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=30)
+    at.query_params["lang"] = args.locale
+    at.run()
+
+    def click_preset(i):
+        return lambda at: at.button(key=f"preset_{i % len(presets)}").click()
+
+    def edit_text(i):
+        return lambda at: at.text_area(key="text_input").input(f"Edit {i}: I wake up at 3 am and cannot fall asleep.")
+
+    def submit(at):
+        next(button for button in at.button if button.label == catalog["submit"]).click()
+
+    # The first submit fills the result cache, so the measured ones show the cached result
+    at.text_area(key="text_input").input(catalog["presets"][presets[0]])
+    submit(at)
+    at.run()
+
+    results = {"preset click": [], "text edit": [], "submit": []}
+    for i in range(args.rounds):
+        results["preset click"].append(measure(at, runners, click_preset(i), "input_fragment"))
+        results["text edit"].append(measure(at, runners, edit_text(i), "input_fragment"))
+        at.text_area(key="text_input").input(catalog["presets"][presets[0]])
+        results["submit"].append(measure(at, runners, submit, "analysis_fragment"))
+
+    print(f"Rounds: {args.rounds}  locale: {args.locale}  webhook: {url}")
+    for name, samples in results.items():
+        summarize(name, samples)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
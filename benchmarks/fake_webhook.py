@@ -0,0 +1,176 @@
+"""Local stand-in for the analysis webhook, for benchmarks and load tests.
+
+Answers POSTs with the same ``{"result": ...}`` contract as the real
+webhook, with configurable latency, payload size, error rate and Drive
+links. It can also answer as server-sent events to exercise streaming.
+
+    python benchmarks/fake_webhook.py --port 8765 --latency lognormal --latency-mean 2
+    SLEEP_WEBHOOK_URL=http://127.0.0.1:8765/ streamlit run app.py
+"""
+import argparse
+import json
+import math
+import random
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+class FakeWebhookConfig:
+    def __init__(self, latency="fixed", latency_mean=1.0, latency_spread=0.5, payload_bytes=1500,
+                 error_rate=0.0, drive_links=1, stream=False, stream_chunks=8, seed=None):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency must be one of {LATENCY_DISTRIBUTIONS}")
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_spread = latency_spread
+        self.payload_bytes = payload_bytes
+        self.error_rate = error_rate
+        self.drive_links = drive_links
+        self.stream = stream
+        self.stream_chunks = stream_chunks
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def sample_latency(self):
+        with self._rng_lock:
+            if self.latency == "uniform":
+                low = max(self.latency_mean - self.latency_spread, 0)
+                return self._rng.uniform(low, self.latency_mean + self.latency_spread)
+            if self.latency == "exponential":
+                return self._rng.expovariate(1 / self.latency_mean) if self.latency_mean > 0 else 0
+            if self.latency == "lognormal":
+                # latency_spread is sigma; mu is chosen so the mean stays latency_mean
+                sigma = self.latency_spread
+                mu = math.log(max(self.latency_mean, 1e-6)) - sigma ** 2 / 2
+                return self._rng.lognormvariate(mu, sigma)
+            return self.latency_mean
+
+    def should_fail(self):
+        with self._rng_lock:
+            return self._rng.random() < self.error_rate
+
+    def build_result(self, user_input):
+        with self._rng_lock:
+            file_ids = [
+                "".join(self._rng.choices(string.ascii_letters + string.digits, k=33))
+                for _ in range(self.drive_links)
+            ]
+        links = "\n".join(f"https://drive.google.com/file/d/{file_id}/view?usp=sharing" for file_id in file_ids)
+        head = f"Analysis of: {user_input[:60]}\n\n"
+        filler_size = max(self.payload_bytes - len(head.encode("utf-8")) - len(links) - 2, 0)
+        filler = ("Relax your shoulders and breathe slowly. " * (filler_size // 41 + 1))[:filler_size]
+        return f"{head}{filler}\n\n{links}"
+
+
+class FakeWebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+    stats = None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            user_input = json.loads(self.rfile.read(length) or b"{}").get("user_input", "")
+        except ValueError:
+            user_input = ""
+        self.stats["requests"] += 1
+
+        latency = self.config.sample_latency()
+        if self.config.should_fail():
+            time.sleep(latency)
+            self.stats["errors"] += 1
+            self._send(500, "application/json", b'{"error": "fake upstream failure"}')
+            return
+
+        result = self.config.build_result(user_input)
+        if self.config.stream:
+            self._stream(result, latency)
+            return
+        time.sleep(latency)
+        self._send(200, "application/json", json.dumps({"result": result}, ensure_ascii=False).encode("utf-8"))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, result, latency):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunks = max(self.config.stream_chunks, 1)
+        step = max(len(result) // chunks, 1)
+        for start in range(0, len(result), step):
+            time.sleep(latency / chunks)
+            self._write_chunk("data: " + json.dumps({"delta": result[start:start + step]}, ensure_ascii=False) + "\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_webhook(config, host="127.0.0.1", port=0):
+    """Start the fake webhook on a daemon thread; returns ``(server, url)``."""
+    handler = type("Handler", (FakeWebhookHandler,), {"config": config, "stats": {"requests": 0, "errors": 0}})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-webhook", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/webhook/fake"
+
+
+def add_config_arguments(parser):
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-mean", type=float, default=1.0, help="mean upstream latency in seconds")
+    parser.add_argument("--latency-spread", type=float, default=0.5,
+                        help="half-width for uniform, sigma for lognormal")
+    parser.add_argument("--payload-bytes", type=int, default=1500)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drive-links", type=int, default=1)
+    parser.add_argument("--stream", action="store_true", help="answer as server-sent events")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args):
+    return FakeWebhookConfig(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_spread=args.latency_spread,
+        payload_bytes=args.payload_bytes,
+        error_rate=args.error_rate,
+        drive_links=args.drive_links,
+        stream=args.stream,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server, url = start_fake_webhook(config_from_args(args), host=args.host, port=args.port)
+    print(f"Fake webhook listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
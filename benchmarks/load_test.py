@@ -0,0 +1,251 @@
+"""Drive many simulated sessions through the Submit Analysis flow.
+
+Starts the fake webhook in-process, points the app at it through
+SLEEP_WEBHOOK_URL and runs ``--sessions`` concurrent Streamlit AppTest
+sessions, each submitting ``--submits`` analyses. Reports throughput,
+end-to-end latency percentiles, peak live threads and memory per session.
+
+Only submits that show a real analysis count as completed; local or stale
+fallbacks and error messages are counted apart. Every AppTest session has
+the same session id and client address, so the admission rate limits are
+off unless SLEEP_SESSION_RATE, SLEEP_IP_RATE or SLEEP_GLOBAL_RATE is set.
+
+Runs that raise are counted as failed and listed by exception type and
+message. AppTest is not built for concurrent use: under load a run now and
+then comes back with an empty page, or widget access fails with a KeyError
+on a ``$$WIDGET_ID-...`` session state key (e.g. the language selectbox's
+format_func). Those are harness failures, not app errors; the session
+redraws its page and carries on, so expect a few of them at 20+ sessions.
+
+    python benchmarks/load_test.py --sessions 20 --submits 3 --latency-mean 0.5
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_webhook import add_config_arguments, config_from_args, start_fake_webhook  # noqa: E402
+
+
+def percentile(samples, q):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class ThreadSampler:
+    """Samples threading.active_count() in the background to find the peak."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+
+def share_mock_runtime():
+    """Keep AppTest usable from several threads at once.
+
+    Every AppTest run installs a mock Runtime singleton and clears it again
+    on teardown, so a session finishing would pull the runtime out from
+    under the others. Fall back to the most recent mock instead.
+    """
+    from streamlit.runtime.runtime import Runtime
+
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+            return cls._instance
+        if "runtime" in last:
+            return last["runtime"]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    Runtime.instance = classmethod(instance)
+
+
+def outcome_classifier(catalog):
+    """Return a function telling from a finished AppTest run what the submit showed.
+
+    "completed" is a real analysis, "fallback" a local or stale answer and
+    "error" one of the app's error messages in place of a result.
+    """
+    notices = {catalog["local_notice"], catalog["stale_notice"]}
+    errors = [
+        re.compile(".*".join(re.escape(part) for part in re.split(r"\{\w+\}", catalog[key])), re.DOTALL)
+        for key in ("busy", "no_result", "parse_error", "upstream_unavailable", "http_error", "request_failed",
+                    "response_too_large", "throttled", "throttled_global")
+    ]
+
+    def classify(at):
+        if at.exception or at.error:
+            return "error"
+        if at.warning or any(info.value in notices for info in at.info):
+            return "fallback"
+        shown = next((m.value for m in at.markdown if m.value.startswith("<div class='result-area'>")), "")
+        text = shown.removeprefix("<div class='result-area'>").removesuffix("</div>")
+        if not text or any(error.fullmatch(text) for error in errors):
+            return "error"
+        return "completed"
+
+    return classify
+
+
+def describe(error):
+    return f"{type(error).__name__}: {error}"
+
+
+def run_session(session_index, args, catalog, latencies, outcomes, failures, ready, start):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(session_index)
+    classify = outcome_classifier(catalog)
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=args.timeout)
+    at.query_params["lang"] = args.locale
+    try:
+        at.run()
+    except Exception as e:
+        failures.append(describe(e))
+        at = None
+    ready.wait()
+    start.wait()
+    if at is None:
+        return
+
+    presets = list(catalog["presets"].values())
+    for submit_index in range(args.submits):
+        if rng.random() < args.preset_ratio:
+            text = rng.choice(presets)
+        else:
+            # Unique text defeats the result cache and single-flight coalescing
+            text = f"Session {session_index} submit {submit_index}: I only sleep {rng.randint(3, 6)} hours."
+        try:
+            if not at.text_area:
+                # Redraw the page an earlier flaky run left empty
+                at.run()
+            at.text_area[0].input(text)
+            submit = next(button for button in at.button if button.label == catalog["submit"])
+            began = time.perf_counter()
+            submit.click().run()
+        except Exception as e:
+            failures.append(describe(e))
+            continue
+        elapsed = time.perf_counter() - began
+        if not at.text_area and not at.exception:
+            failures.append("AppTest run returned an empty page")
+            continue
+        outcome = classify(at)
+        outcomes.append(outcome)
+        if outcome == "completed":
+            latencies.append(elapsed)
+        # Exceptions raised by the app script itself, as Streamlit renders them
+        failures.extend(
+            f"{exception.proto.type}: {exception.proto.message} (in the app)" for exception in at.exception
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--submits", type=int, default=3, help="submits per session")
+    parser.add_argument("--preset-ratio", type=float, default=0.5,
+                        help="share of submits that use a preset text")
+    parser.add_argument("--locale", default="en")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--webhook-url", help="use an already running webhook instead of the in-process fake")
+    add_config_arguments(parser)
+    parser.set_defaults(latency_mean=0.5, latency_spread=0.4)
+    args = parser.parse_args()
+
+    server = None
+    if args.webhook_url:
+        url = args.webhook_url
+    else:
+        server, url = start_fake_webhook(config_from_args(args))
+    # Configure the app before any of its modules are imported
+    os.environ["SLEEP_WEBHOOK_URL"] = url
+    os.environ.setdefault("SLEEP_CACHE_DIR", tempfile.mkdtemp(prefix="sleep-bench-cache-"))
+    # All sessions share one session id and address; their rate limits would turn most submits into fallbacks
+    for name in ("SLEEP_SESSION_RATE", "SLEEP_IP_RATE", "SLEEP_GLOBAL_RATE"):
+        os.environ.setdefault(name, "0")
+
+    import streamlit.logger
+    from locales import load_catalog
+
+    # AppTest runs outside `streamlit run`, which Streamlit warns about on every session
+    streamlit.logger.set_log_level("error")
+    catalog = load_catalog(args.locale)
+    share_mock_runtime()
+    latencies, outcomes, failures = [], [], []
+    ready = threading.Barrier(args.sessions + 1)
+    start = threading.Barrier(args.sessions + 1)
+
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    threads_before = threading.active_count()
+    sessions = [
+        threading.Thread(target=run_session, args=(i, args, catalog, latencies, outcomes, failures, ready, start))
+        for i in range(args.sessions)
+    ]
+    with ThreadSampler() as sampler:
+        for thread in sessions:
+            thread.start()
+        ready.wait()
+        memory_idle = tracemalloc.get_traced_memory()[0]
+        began = time.perf_counter()
+        start.wait()
+        for thread in sessions:
+            thread.join()
+        elapsed = time.perf_counter() - began
+    tracemalloc.stop()
+
+    completed = len(latencies)
+    print(f"Sessions: {args.sessions}  submits/session: {args.submits}  webhook: {url}")
+    print(f"Completed: {completed}  fallbacks: {outcomes.count('fallback')}  errors: {outcomes.count('error')}"
+          f"  failed: {len(failures)}  wall time: {elapsed:.2f} s")
+    for failure, count in Counter(failures).most_common():
+        print(f"  {count} x {failure}")
+    print(f"Throughput: {completed / elapsed:.2f} analyses/s")
+    if latencies:
+        print(
+            "End-to-end latency: "
+            f"mean {statistics.mean(latencies) * 1000:.0f} ms  "
+            f"p50 {percentile(latencies, 50) * 1000:.0f} ms  "
+            f"p95 {percentile(latencies, 95) * 1000:.0f} ms  "
+            f"p99 {percentile(latencies, 99) * 1000:.0f} ms"
+        )
+    print(f"Threads alive: {threads_before} before, {sampler.peak} peak, {threading.active_count()} after")
+    print(f"Memory per idle session: {(memory_idle - memory_before) / args.sessions / 1024:.1f} KiB (tracemalloc)")
+    if server is not None:
+        print(f"Upstream requests: {server.RequestHandlerClass.stats['requests']}"
+              f"  upstream errors: {server.RequestHandlerClass.stats['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+
+import metrics
+from audio_proxy import extract_drive_ids
+from result_cache import cache_key
+
+# History limits, each can be overridden by an environment variable; SLEEP_HISTORY_ENTRIES=0 turns history off
+DEFAULT_MAX_ENTRIES = 20
+DEFAULT_SESSION_BYTES = 64 * 1024
+DEFAULT_TOTAL_BYTES = 32 * 1024 * 1024
+# Input hashes only need to tell a session's own descriptions apart
+INPUT_HASH_BYTES = 8
+# Footprint of a session's own bookkeeping, counted on top of its entries
+SESSION_OVERHEAD = sys.getsizeof(deque()) + sys.getsizeof([None, 0])
+
+
+def input_hash(user_input, locale):
+    return bytes.fromhex(cache_key(user_input, locale))[:INPUT_HASH_BYTES]
+
+
+class HistoryEntry:
+    """One past analysis in compact form.
+
+    The input is kept only as a short hash of its cache key and the result
+    text is zlib-compressed; ``size`` is the entry's approximate footprint.
+    """
+
+    __slots__ = ("input_hash", "locale", "created", "seconds", "source", "drive_ids", "size", "_result")
+
+    def __init__(self, user_input, locale, result, seconds=None, source=None):
+        self.input_hash = input_hash(user_input, locale)
+        self.locale = locale
+        self.created = time.time()
+        self.seconds = seconds
+        self.source = source
+        self.drive_ids = tuple(extract_drive_ids(result))
+        self._result = zlib.compress(result.encode("utf-8"))
+        self.size = (
+            sys.getsizeof(self) + sys.getsizeof(self._result) + sys.getsizeof(self.input_hash)
+            + sys.getsizeof(self.drive_ids) + sum(sys.getsizeof(file_id) for file_id in self.drive_ids)
+        )
+
+    @property
+    def result(self):
+        return zlib.decompress(self._result).decode("utf-8")
+
+
+class AnalysisHistory:
+    """Past analyses of every session in the process, bounded in memory.
+
+    Each session keeps at most ``max_entries`` entries and ``session_bytes``
+    bytes, dropping its oldest entries first. Past ``total_bytes`` across
+    all sessions, entries of the least recently active sessions go first,
+    so sessions left idle make room for the ones in use.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, session_bytes=DEFAULT_SESSION_BYTES,
+                 total_bytes=DEFAULT_TOTAL_BYTES):
+        self.max_entries = max_entries
+        self.session_bytes = session_bytes
+        self.total_bytes = total_bytes
+        # Session id -> [entries oldest first, bytes], least recently active session first
+        self._sessions = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.environ.get("SLEEP_HISTORY_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            session_bytes=int(os.environ.get("SLEEP_HISTORY_SESSION_BYTES", DEFAULT_SESSION_BYTES)),
+            total_bytes=int(os.environ.get("SLEEP_HISTORY_TOTAL_BYTES", DEFAULT_TOTAL_BYTES)),
+        )
+
+    def add(self, session_id, user_input, locale, result, seconds=None, source=None):
+        """Record an analysis for ``session_id``; returns the entry, or None if it cannot be kept."""
+        if self.max_entries <= 0:
+            return None
+        entry = HistoryEntry(user_input, locale, result, seconds=seconds, source=source)
+        if entry.size + SESSION_OVERHEAD > min(self.session_bytes, self.total_bytes):
+            metrics.inc("history_rejected")
+            return None
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = [deque(), SESSION_OVERHEAD]
+                self._total += SESSION_OVERHEAD
+            self._sessions.move_to_end(session_id)
+            session[0].append(entry)
+            session[1] += entry.size
+            self._total += entry.size
+            while len(session[0]) > self.max_entries or session[1] > self.session_bytes:
+                self._evict_oldest(session_id)
+            while self._total > self.total_bytes:
+                self._evict_oldest(next(iter(self._sessions)))
+        return entry
+
+    def _evict_oldest(self, session_id):
+        session = self._sessions[session_id]
+        entry = session[0].popleft()
+        session[1] -= entry.size
+        self._total -= entry.size
+        if not session[0]:
+            del self._sessions[session_id]
+            self._total -= session[1]
+        metrics.inc("history_evictions")
+
+    def entries(self, session_id):
+        """The session's entries, newest first."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(reversed(session[0]))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "entries": sum(len(entries) for entries, _ in self._sessions.values()),
+                "bytes": self._total,
+            }
@@ -0,0 +1,224 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from jobs import JobCancelled
+from result_cache import DEFAULT_CACHE_DIR, store_backend
+from webhook import REQUEST_TIMEOUT
+
+# Finished jobs stay reattachable for this long (seconds)
+DEFAULT_JOB_TTL = 24 * 60 * 60
+# How long a claim on an input holds off other workers; longer than any webhook call can take
+DEFAULT_CLAIM_LEASE = 2 * REQUEST_TIMEOUT
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+class MemoryJobStore:
+    """Per-process job store, for single-process deployments and tests.
+
+    Implements the same interface as ``SQLiteJobStore``: ``create``,
+    ``finish``, ``get`` and ``claim``.
+    """
+
+    def __init__(self, ttl=DEFAULT_JOB_TTL, lease=DEFAULT_CLAIM_LEASE):
+        self.ttl = ttl
+        self.lease = lease
+        self._jobs = {}
+        self._claims = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, user_input, locale):
+        now = time.time()
+        with self._lock:
+            self._jobs.setdefault(job_id, {
+                "id": job_id, "user_input": user_input, "locale": locale,
+                "state": "pending", "result": None, "updated": now,
+            })
+            for stale_id in [i for i, job in self._jobs.items() if job["updated"] < now - self.ttl]:
+                del self._jobs[stale_id]
+
+    def finish(self, job_id, result, state="done"):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(state=state, result=result, updated=time.time())
+            for key in [key for key, (holder, _) in self._claims.items() if holder == job_id]:
+                del self._claims[key]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or time.time() - job["updated"] > self.ttl:
+                return None
+            return {key: job[key] for key in ("id", "user_input", "locale", "state", "result")}
+
+    def claim(self, key, job_id):
+        now = time.time()
+        with self._lock:
+            holder, expires = self._claims.get(key, (None, 0))
+            if holder is not None and expires > now and self._jobs.get(holder, {}).get("state") == "pending":
+                return holder
+            self._claims[key] = (job_id, now + self.lease)
+            return job_id
+
+
+class SQLiteJobStore:
+    """SQLite record of submitted analyses, shared by every worker process on the host.
+
+    A reloaded page finds its job here by id, and ``claim`` lets the
+    processes agree on which one runs an input the others are also waiting
+    for. The database runs in WAL mode so the worker threads recording
+    finished jobs never block sessions reading them.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_JOB_TTL, lease=DEFAULT_CLAIM_LEASE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, user_input TEXT NOT NULL, locale TEXT NOT NULL,"
+            " state TEXT NOT NULL, result TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, job_id TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def create(self, job_id, user_input, locale):
+        """Record a submitted job; a job that is already recorded is left alone."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (id, user_input, locale, state, created, updated)"
+                " VALUES (?, ?, ?, 'pending', ?, ?)",
+                (job_id, user_input, locale, now, now),
+            )
+            self._conn.execute("DELETE FROM jobs WHERE updated < ?", (now - self.ttl,))
+            self._conn.execute("DELETE FROM claims WHERE expires < ?", (now,))
+
+    def finish(self, job_id, result, state="done"):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, updated = ? WHERE id = ?",
+                (state, json.dumps(result, ensure_ascii=False) if result is not None else None, time.time(), job_id),
+            )
+            self._conn.execute("DELETE FROM claims WHERE job_id = ?", (job_id,))
+
+    def get(self, job_id):
+        """Return the job as a dict (``result`` decoded), or None if unknown or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_input, locale, state, result, updated FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None or time.time() - row[4] > self.ttl:
+            return None
+        return {
+            "id": job_id,
+            "user_input": row[0],
+            "locale": row[1],
+            "state": row[2],
+            "result": json.loads(row[3]) if row[3] is not None else None,
+        }
+
+    def claim(self, key, job_id):
+        """Claim the right to analyze ``key`` for ``job_id``; returns the job id holding the claim.
+
+        An existing claim stands while its job is pending and its lease has
+        not run out, so a crashed process never blocks an input for long.
+        """
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front so two processes cannot both see the claim as free
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT claims.job_id, claims.expires, jobs.state FROM claims"
+                    " LEFT JOIN jobs ON jobs.id = claims.job_id WHERE claims.key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None and row[1] > now and row[2] == "pending":
+                    holder = row[0]
+                else:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO claims (key, job_id, expires) VALUES (?, ?, ?)",
+                        (key, job_id, now + self.lease),
+                    )
+                    holder = job_id
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return holder
+
+
+def job_store_from_env():
+    """Open the job store selected by SLEEP_STORE.
+
+    The SQLite store lives at SLEEP_JOB_STORE, defaulting to jobs.sqlite3
+    in the cache directory.
+    """
+    ttl = float(os.environ.get("SLEEP_JOB_TTL", DEFAULT_JOB_TTL))
+    cache_dir = os.environ.get("SLEEP_CACHE_DIR", DEFAULT_CACHE_DIR)
+    path = os.environ.get("SLEEP_JOB_STORE") or (os.path.join(cache_dir, "jobs.sqlite3") if cache_dir else None)
+    if store_backend() == "memory" or not path:
+        return MemoryJobStore(ttl=ttl)
+    return SQLiteJobStore(path, ttl=ttl)
+
+
+def shareable(result):
+    """Whether a finished job's result is a real analysis other jobs may show as their own.
+
+    Errors and the local or stale fallbacks answer one failed call; a job
+    waiting on the same input tries the webhook itself instead.
+    """
+    return isinstance(result, dict) and "error" not in result and result.get("source") not in ("local", "stale")
+
+
+def wait_for_claim(store, key, job_id, cancelled=lambda: False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Block while another process holds the claim on ``key``.
+
+    Returns that process's result once its job is done with a shareable
+    result, or None as soon as ``job_id`` holds the claim and should run
+    the analysis itself. Raises JobCancelled if ``cancelled()`` turns true
+    while waiting.
+    """
+    holder = store.claim(key, job_id)
+    while holder != job_id:
+        if cancelled():
+            raise JobCancelled()
+        time.sleep(poll_interval)
+        previous, holder = holder, store.claim(key, job_id)
+        if holder != previous:
+            # The holder finished, so its claim went; share its analysis if it got one. A claim taken
+            # here in the meantime is released when the caller finishes its own job.
+            stored = store.get(previous)
+            if stored is not None and stored["state"] == "done" and shareable(stored["result"]):
+                return stored["result"]
+    return None
+
+
+def wait_for_job(store, job_id, cancelled=lambda: False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Block while ``job_id``, run by another process, is still pending.
+
+    Returns its result once it finishes, or None if it is cancelled,
+    expires or stays pending past the claim lease (its process is likely
+    gone). Raises JobCancelled if ``cancelled()`` turns true while waiting.
+    """
+    deadline = time.monotonic() + store.lease
+    while True:
+        stored = store.get(job_id)
+        if stored is None or stored["state"] != "pending":
+            return stored["result"] if stored is not None and stored["state"] == "done" else None
+        if time.monotonic() > deadline:
+            return None
+        if cancelled():
+            raise JobCancelled()
+        time.sleep(poll_interval)
@@ -0,0 +1,250 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+import metrics
+
+# Worker pool defaults, overridable via SLEEP_MAX_WORKERS / SLEEP_MAX_QUEUED
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_QUEUED = 32
+# Seconds a job may go unwatched, e.g. while a refreshed page reconnects, before it is cancelled
+DEFAULT_ORPHAN_GRACE = 30
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the pending queue is at capacity."""
+
+
+class JobCancelled(Exception):
+    """Raised from ``Job.publish`` once nobody is waiting for the job any more."""
+
+
+class Job:
+    """A unit of work run by a JobQueue worker, waitable like a future.
+
+    ``fn`` is called with the job itself so it can ``publish`` partial
+    output (e.g. streamed text) that waiters pick up via ``wait_for_update``.
+    ``watchers`` holds the sessions waiting for the result; a job whose
+    watchers have all gone is cancelled before it starts, or made to stop
+    at its next ``publish`` while running. ``id`` lets a reconnecting
+    session find the job again.
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.id = uuid.uuid4().hex
+        self.key = None
+        self.state = "queued"
+        self.result = None
+        self.error = None
+        self.partial = None
+        self.version = 0
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.watchers = set()
+        self.orphaned_at = None
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._cond = threading.Condition()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def publish(self, partial):
+        if self.cancelled():
+            raise JobCancelled()
+        with self._cond:
+            self.partial = partial
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait_for_update(self, version, timeout=None):
+        """Block until the job publishes past ``version`` or finishes."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.version != version or self.done(), timeout)
+
+    def _run(self):
+        metrics.observe("queue_wait", time.perf_counter() - self.submitted_at)
+        self.state = "running"
+        try:
+            self.result = self.fn(self)
+        except JobCancelled:
+            self.state = "cancelled"
+        except Exception as e:
+            self.error = e
+        finally:
+            self._finish("cancelled" if self.cancelled() else "done")
+
+    def _finish(self, state):
+        self.state = state
+        with self._cond:
+            self._done.set()
+            self._cond.notify_all()
+
+
+class JobQueue:
+    """Fixed-size worker pool fed by a bounded FIFO queue of jobs.
+
+    ``is_alive(watcher)`` tells whether a watcher (a browser session) is
+    still connected; jobs left without live watchers for ``orphan_grace``
+    seconds are cancelled.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_queued=DEFAULT_MAX_QUEUED, is_alive=None,
+                 orphan_grace=DEFAULT_ORPHAN_GRACE):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.is_alive = is_alive
+        self.orphan_grace = orphan_grace
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._running = 0
+        self._active = set()
+        self._inflight = {}
+        self._by_id = {}
+
+    @classmethod
+    def from_env(cls, is_alive=None):
+        return cls(
+            max_workers=int(os.environ.get("SLEEP_MAX_WORKERS", DEFAULT_MAX_WORKERS)),
+            max_queued=int(os.environ.get("SLEEP_MAX_QUEUED", DEFAULT_MAX_QUEUED)),
+            is_alive=is_alive,
+            orphan_grace=float(os.environ.get("SLEEP_JOB_ORPHAN_GRACE", DEFAULT_ORPHAN_GRACE)),
+        )
+
+    def submit(self, fn, key=None, watcher=None, admit=None):
+        """Queue ``fn`` for execution, raising QueueFullError when at capacity.
+
+        Jobs submitted with the same ``key`` while an earlier one is still
+        queued or running share that job (single-flight) instead of running
+        ``fn`` again. ``watcher`` is recorded as waiting for the result.
+        ``admit()`` is called only when a new job is about to be queued, and
+        may raise to refuse it.
+        """
+        with self._cond:
+            # Disconnected sessions free their queue slots before capacity is checked
+            self._sweep()
+            if key is not None:
+                existing = self._inflight.get(key)
+                if existing is not None:
+                    metrics.inc("jobs_coalesced")
+                    if watcher is not None:
+                        existing.watchers.add(watcher)
+                        existing.orphaned_at = None
+                    return existing
+            # Idle workers take jobs immediately, so only the overflow counts against the queue
+            idle = self.max_workers - self._running
+            if len(self._pending) >= self.max_queued + max(idle, 0):
+                metrics.inc("jobs_rejected")
+                raise QueueFullError(f"{len(self._pending)} jobs already queued")
+            if admit is not None:
+                admit()
+            job = Job(fn)
+            if watcher is not None:
+                job.watchers.add(watcher)
+            self._pending.append(job)
+            self._by_id[job.id] = job
+            if key is not None:
+                job.key = key
+                self._inflight[key] = job
+            # Workers are started lazily, up to the configured limit
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._work, name=f"analysis-worker-{len(self._workers)}", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._cond.notify()
+        return job
+
+    def attach(self, job_id, watcher):
+        """Add ``watcher`` to the queued or running job ``job_id``; None if there is no such job."""
+        with self._cond:
+            job = self._by_id.get(job_id)
+            if job is None or job.cancelled():
+                return None
+            job.watchers.add(watcher)
+            job.orphaned_at = None
+            return job
+
+    def release(self, job, watcher):
+        """Stop ``watcher`` waiting for ``job``, cancelling it if nobody else is."""
+        with self._cond:
+            job.watchers.discard(watcher)
+            if not job.watchers:
+                self._cancel(job)
+
+    def _sweep(self):
+        # Forget watchers that disconnected and cancel the jobs nobody has waited for in a while
+        if self.is_alive is None:
+            return
+        now = time.monotonic()
+        for job in list(self._pending) + list(self._active):
+            if job.watchers:
+                job.watchers = {watcher for watcher in job.watchers if self.is_alive(watcher)}
+                if not job.watchers:
+                    job.orphaned_at = now
+            if job.orphaned_at is not None and now - job.orphaned_at >= self.orphan_grace:
+                self._cancel(job)
+
+    def _cancel(self, job):
+        if job.done() or job.cancelled():
+            return
+        job._cancelled.set()
+        metrics.inc("jobs_cancelled")
+        if job.key is not None and self._inflight.get(job.key) is job:
+            # New submits of the same input start afresh rather than joining a dying job
+            del self._inflight[job.key]
+        if job in self._pending:
+            self._pending.remove(job)
+            self._by_id.pop(job.id, None)
+            job._finish("cancelled")
+
+    def position(self, job):
+        """1-based position of a queued job, or 0 once it has left the queue."""
+        with self._cond:
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return 0
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": len(self._workers),
+                "running": self._running,
+                "max_workers": self.max_workers,
+                "queued": len(self._pending),
+                "inflight_keys": len(self._inflight),
+                "detached": sum(job.cancelled() for job in self._active),
+                "max_queued": self.max_queued,
+            }
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                self._sweep()
+                if not self._pending:
+                    continue
+                job = self._pending.popleft()
+                job.started_at = time.perf_counter()
+                self._running += 1
+                self._active.add(job)
+            try:
+                job._run()
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._active.discard(job)
+                    self._by_id.pop(job.id, None)
+                    if job.key is not None and self._inflight.get(job.key) is job:
+                        del self._inflight[job.key]
@@ -0,0 +1,116 @@
+import json
+import os
+import re
+from collections import Counter
+
+import metrics
+from locales import load_catalog
+
+# Themes in the same order as the preset options of every locale
+THEMES = ("insomnia", "stress", "light_sleep", "irregular_schedule", "fatigue")
+
+# English and Chinese keywords per theme; inputs in either language match regardless of the UI locale
+KEYWORDS = {
+    "insomnia": (
+        "insomnia", "can't sleep", "cannot sleep", "can't fall asleep", "trouble sleeping", "toss and turn",
+        "tossing", "lie awake", "lying awake", "awake for hours", "irritable", "irritability", "angry",
+        "失眠", "睡不著", "睡不着", "難以入睡", "輾轉反側", "翻來覆去", "煩躁", "發脾氣", "易怒",
+    ),
+    "stress": (
+        "stress", "stressed", "anxiety", "anxious", "nervous", "worry", "worried", "racing thoughts",
+        "mind keeps racing", "overthinking", "can't relax", "heart rate", "palpitation", "short of breath",
+        "panic", "work", "deadline",
+        "壓力", "焦慮", "緊張", "擔心", "想太多", "胡思亂想", "無法放鬆", "心跳", "心悸", "呼吸困難", "工作",
+    ),
+    "light_sleep": (
+        "light sleep", "sleep lightly", "light sleeper", "dream", "dreams", "dreaming", "nightmare",
+        "wake up easily", "slightest sound", "noise", "sensitive", "sad", "depressed", "down", "lost interest",
+        "淺眠", "睡眠很淺", "多夢", "做夢", "作夢", "惡夢", "噩夢", "容易醒", "一點聲音", "敏感", "低落", "失落",
+        "難過", "提不起興趣",
+    ),
+    "irregular_schedule": (
+        "irregular", "schedule", "routine", "shift", "night shift", "overtime", "jet lag", "biological clock",
+        "body clock", "circadian", "3 am", "afternoon", "mood swings", "emotions fluctuate",
+        "作息", "不規律", "日夜顛倒", "輪班", "夜班", "加班", "時差", "生理時鐘", "凌晨", "下午才起床",
+        "情緒起伏", "情緒波動",
+    ),
+    "fatigue": (
+        "tired", "fatigue", "exhausted", "exhaustion", "sluggish", "drained", "not enough sleep", "peace",
+        "calm", "restless", "mentally alert", "wired",
+        "疲勞", "疲憊", "累", "精神不濟", "睡眠不足", "平靜", "安穩", "放空", "精神變好",
+    ),
+}
+
+DRIVE_VIEW_URL = "https://drive.google.com/file/d/{file_id}/view?usp=sharing"
+
+
+def local_fallback_enabled():
+    """The local analyzer answers when the webhook fails unless SLEEP_LOCAL_FALLBACK=0."""
+    return os.environ.get("SLEEP_LOCAL_FALLBACK", "1").lower() not in ("0", "false", "no")
+
+
+def local_preview_enabled():
+    """Showing the local analysis while the webhook runs is opt-in via SLEEP_LOCAL_PREVIEW=1."""
+    return os.environ.get("SLEEP_LOCAL_PREVIEW", "").lower() in ("1", "true", "yes")
+
+
+def _compile(keywords):
+    # One alternation for every keyword, longest first so phrases win over their words.
+    # Latin keywords only match whole words; CJK text has no word boundaries to rely on.
+    owners = {}
+    for theme, words in keywords.items():
+        for word in words:
+            owners.setdefault(word.casefold(), []).append(theme)
+    parts = []
+    for word in sorted(owners, key=len, reverse=True):
+        escaped = re.escape(word)
+        parts.append(rf"\b{escaped}\b" if word.isascii() else escaped)
+    return re.compile("|".join(parts)), owners
+
+
+class LocalAnalyzer:
+    """Rule-based stand-in for the webhook that answers in milliseconds.
+
+    Classifies the input into one of the preset themes with a precompiled
+    keyword index and returns that theme's canned analysis from the locale
+    catalog, plus a pre-chosen track when one is known for the theme.
+    """
+
+    def __init__(self, keywords=KEYWORDS, tracks=None):
+        self.tracks = dict(tracks or {})
+        self._pattern, self._owners = _compile(keywords)
+
+    @classmethod
+    def from_env(cls):
+        """Read theme-to-Drive-file-ID tracks from the JSON file in SLEEP_LOCAL_TRACKS, if set."""
+        tracks = None
+        path = os.environ.get("SLEEP_LOCAL_TRACKS")
+        if path:
+            with open(path, encoding="utf-8") as f:
+                tracks = json.load(f)
+        return cls(tracks=tracks)
+
+    def classify(self, text):
+        """Return the best matching theme; inputs without any keyword get the first theme."""
+        scores = Counter()
+        for match in self._pattern.finditer((text or "").casefold()):
+            for theme in self._owners[match.group(0)]:
+                scores[theme] += 1
+        if not scores:
+            return THEMES[0]
+        # Ties go to the theme listed first
+        return max(THEMES, key=lambda theme: scores[theme])
+
+    def analyze(self, text, locale, theme=None, track_id=None):
+        """Return a webhook-shaped payload for ``text``, marked with ``source: local``.
+
+        ``track_id`` is linked when no track is configured for the theme.
+        """
+        with metrics.timer("local_analysis"):
+            theme = theme or self.classify(text)
+            result = load_catalog(locale)["local_analyses"][theme]
+            track_id = self.tracks.get(theme) or track_id
+            if track_id:
+                result += "\n\n" + DRIVE_VIEW_URL.format(file_id=track_id)
+        metrics.inc("local_analyses")
+        return {"result": result, "source": "local", "theme": theme}
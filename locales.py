@@ -0,0 +1,24 @@
+import json
+import os
+from functools import lru_cache
+
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+
+# Supported locales and how they are named in the language picker
+LANGUAGE_NAMES = {
+    "en": "English",
+    "zh-TW": "繁體中文",
+}
+DEFAULT_LOCALE = os.environ.get("SLEEP_DEFAULT_LOCALE", "en")
+
+
+def resolve_locale(requested):
+    """Return ``requested`` if it is supported, otherwise the default locale."""
+    return requested if requested in LANGUAGE_NAMES else DEFAULT_LOCALE
+
+
+@lru_cache(maxsize=None)
+def load_catalog(locale):
+    """Load a locale's strings on first use; later calls hit the in-process cache."""
+    with open(os.path.join(LOCALE_DIR, f"{locale}.json"), encoding="utf-8") as f:
+        return json.load(f)
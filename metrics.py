@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram buckets in seconds, spanning cache hits up to the 95 s webhook timeout
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 95)
+PROFILE_INTERVAL = 0.01
+PROFILE_TOP_STACKS = 5
+# Worker processes sharing a metrics base port each take the next free one
+PORT_ATTEMPTS = 16
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus style."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """Thread-safe collection of named latency histograms and counters."""
+
+    def __init__(self, log_events=False):
+        self.log_events = log_events
+        self._histograms = {}
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+        if self.log_events:
+            logger.info(json.dumps({"metric": name, "seconds": round(seconds, 6), "ts": time.time()}))
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+        if self.log_events:
+            logger.info(json.dumps({"metric": name, "inc": amount, "ts": time.time()}))
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "histograms": {
+                    name: {"count": h.count, "sum": h.sum} for name, h in self._histograms.items()
+                },
+                "counters": dict(self._counters),
+            }
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            for name in sorted(self._histograms):
+                histogram = self._histograms[name]
+                metric = f"sleep_{name}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for bound, total in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f'{metric}_bucket{{le="{le}"}} {total}')
+                lines.append(f"{metric}_sum {histogram.sum}")
+                lines.append(f"{metric}_count {histogram.count}")
+            for name in sorted(self._counters):
+                metric = f"sleep_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {self._counters[name]}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry; SLEEP_METRICS_LOG=1 also emits every event as a JSON log line
+REGISTRY = MetricsRegistry(log_events=os.environ.get("SLEEP_METRICS_LOG", "").lower() in ("1", "true", "yes"))
+observe = REGISTRY.observe
+inc = REGISTRY.inc
+timer = REGISTRY.timer
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port, host="127.0.0.1", registry=REGISTRY, attempts=PORT_ATTEMPTS):
+    """Serve ``registry`` at http://host:port/metrics from a daemon thread.
+
+    Every worker process keeps its own registry, so when ``port`` is taken
+    (by another worker) the next free one of ``attempts`` ports is used.
+    Returns None, logging why, when none of them is free.
+    """
+    handler = type("MetricsRequestHandler", (_MetricsRequestHandler,), {"registry": registry})
+    for candidate in range(port, port + attempts):
+        try:
+            server = ThreadingHTTPServer((host, candidate), handler)
+            break
+        except OSError as e:
+            error = e
+    else:
+        logger.warning("Metrics server not started, ports %d-%d unavailable: %s", port, port + attempts - 1, error)
+        return None
+    logger.info("Serving metrics of process %d at http://%s:%d/metrics", os.getpid(), host, server.server_port)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+class _StackSampler:
+    """Periodically records the call stack of one thread."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="slow-call-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = traceback.extract_stack(frame, limit=12)
+                self.samples[tuple(f"{f.filename}:{f.lineno} {f.name}" for f in stack)] += 1
+
+
+@contextmanager
+def profile_if_slow(label, threshold=None):
+    """Sample the current thread's stack and log it if the block runs slow.
+
+    The threshold defaults to SLEEP_PROFILE_SLOW_SECONDS; when neither is set
+    the block runs without any profiling overhead.
+    """
+    if threshold is None:
+        threshold = float(os.environ.get("SLEEP_PROFILE_SLOW_SECONDS", 0) or 0)
+    if threshold <= 0:
+        yield
+        return
+
+    sampler = _StackSampler(threading.get_ident())
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        elapsed = time.perf_counter() - started
+        if elapsed >= threshold:
+            inc("slow_calls")
+            total = sum(sampler.samples.values()) or 1
+            report = []
+            for stack, count in sampler.samples.most_common(PROFILE_TOP_STACKS):
+                report.append(f"{count / total:.0%} of samples:\n    " + "\n    ".join(stack))
+            logger.warning("Slow %s took %.2f s; top sampled stacks:\n%s", label, elapsed, "\n".join(report))
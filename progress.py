@@ -0,0 +1,71 @@
+import bisect
+import os
+import threading
+from collections import deque
+
+# Until real samples arrive, assume analyses take about this long (seconds)
+DEFAULT_PRIOR = 60.0
+DEFAULT_WINDOW = 200
+# Never show a finished bar before the result is actually there
+MAX_PROGRESS = 0.99
+
+
+class LatencyEstimator:
+    """Rolling window of observed webhook latencies used for honest progress.
+
+    Progress is the share of recent analyses that had finished by the
+    current elapsed time, and the ETA is the median remaining time of the
+    recent analyses that ran longer than that.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, prior=DEFAULT_PRIOR):
+        self.prior = prior
+        self._samples = deque(maxlen=window)
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            window=int(os.environ.get("SLEEP_ETA_WINDOW", DEFAULT_WINDOW)),
+            prior=float(os.environ.get("SLEEP_ETA_PRIOR", DEFAULT_PRIOR)),
+        )
+
+    def record(self, seconds):
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                oldest = self._samples[0]
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+            self._samples.append(seconds)
+            bisect.insort(self._sorted, seconds)
+
+    def _ordered(self):
+        with self._lock:
+            return list(self._sorted) if self._sorted else [self.prior]
+
+    def percentile(self, q):
+        ordered = self._ordered()
+        index = min(int(q / 100 * len(ordered)), len(ordered) - 1)
+        return ordered[index]
+
+    def estimate(self, elapsed):
+        """Return ``(progress, eta)`` for an analysis running ``elapsed`` seconds.
+
+        ``eta`` is None once the analysis has outlived every recent sample.
+        """
+        ordered = self._ordered()
+        finished = bisect.bisect_right(ordered, elapsed)
+        progress = min(finished / len(ordered), MAX_PROGRESS)
+        remaining = ordered[finished:]
+        if not remaining:
+            return MAX_PROGRESS, None
+        return progress, remaining[len(remaining) // 2] - elapsed
+
+
+def display_eta(eta):
+    """Round an ETA so the on-screen value only changes when it matters."""
+    if eta is None:
+        return None
+    if eta < 10:
+        return max(int(eta + 0.5), 1)
+    return int(eta / 5 + 0.5) * 5
@@ -0,0 +1,197 @@
+import os
+import queue
+import threading
+import time
+
+import requests
+
+import metrics
+from webhook import WebhookError, WebhookHTTPError
+
+# Circuit breaker and hedging defaults, each can be overridden by an environment variable
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_MIN_DELAY = 2.0
+DEFAULT_HEDGE_MAX_INFLIGHT = 4
+
+
+def hedging_enabled():
+    """Hedged webhook requests are opt-in via SLEEP_HEDGE=1."""
+    return os.environ.get("SLEEP_HEDGE", "").lower() in ("1", "true", "yes")
+
+
+def is_upstream_failure(error):
+    """Whether ``error`` says the upstream is unhealthy rather than the request being bad."""
+    if isinstance(error, WebhookHTTPError):
+        return error.status_code >= 500
+    return isinstance(error, requests.RequestException)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the webhook while the circuit is open."""
+
+
+class CircuitBreaker:
+    """Stops calling the webhook after repeated upstream failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    every call fails fast with ``CircuitOpenError``. Once ``reset_timeout``
+    seconds have passed a single probe call is let through; its success
+    closes the circuit again, its failure keeps it open for another period.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            failure_threshold=int(os.environ.get("SLEEP_BREAKER_FAILURES", DEFAULT_FAILURE_THRESHOLD)),
+            reset_timeout=float(os.environ.get("SLEEP_BREAKER_RESET", DEFAULT_RESET_TIMEOUT)),
+        )
+
+    def is_open(self):
+        """True while calls would be rejected; does not start a probe."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.OPEN:
+                return time.monotonic() - self._opened_at < self.reset_timeout
+            # A probe is already in flight
+            return True
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                metrics.inc("circuit_closed")
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    metrics.inc("circuit_opened")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def _release_probe(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def call(self, fn, *args, **kwargs):
+        """Run ``fn`` through the breaker, failing fast while it is open."""
+        if not self.allow():
+            metrics.inc("circuit_rejections")
+            raise CircuitOpenError("webhook circuit is open")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure()
+            elif isinstance(e, WebhookError):
+                # The upstream answered, just not usefully; that still proves it is up
+                self.record_success()
+            else:
+                # The call ended without an answer either way (e.g. it was cancelled); let the next call probe
+                self._release_probe()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures}
+
+
+class Hedger:
+    """Sends a backup request when the first one is slower than usual.
+
+    The primary attempt starts right away. If it has not finished after the
+    ``percentile``-th recent webhook latency (never less than ``min_delay``
+    seconds) the hedge attempt starts too, and whichever succeeds first wins.
+    At most ``max_inflight`` hedges run at once so a slow upstream is not
+    flooded with duplicate work. The losing attempt runs to completion in the
+    background; its connection goes back to the pool as usual.
+    """
+
+    def __init__(self, estimator, percentile=DEFAULT_HEDGE_PERCENTILE, min_delay=DEFAULT_HEDGE_MIN_DELAY,
+                 max_inflight=DEFAULT_HEDGE_MAX_INFLIGHT):
+        self.estimator = estimator
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self._slots = threading.BoundedSemaphore(max_inflight)
+
+    @classmethod
+    def from_env(cls, estimator):
+        return cls(
+            estimator,
+            percentile=float(os.environ.get("SLEEP_HEDGE_PERCENTILE", DEFAULT_HEDGE_PERCENTILE)),
+            min_delay=float(os.environ.get("SLEEP_HEDGE_MIN_DELAY", DEFAULT_HEDGE_MIN_DELAY)),
+            max_inflight=int(os.environ.get("SLEEP_HEDGE_MAX_INFLIGHT", DEFAULT_HEDGE_MAX_INFLIGHT)),
+        )
+
+    def delay(self):
+        return max(self.estimator.percentile(self.percentile), self.min_delay)
+
+    def run(self, primary, hedge):
+        """Call ``primary()`` and, if it is slow, ``hedge()``; return the first success."""
+        outcomes = queue.Queue()
+        self._start(primary, "primary", outcomes)
+        pending = 1
+        try:
+            first = outcomes.get(timeout=self.delay())
+        except queue.Empty:
+            first = None
+            if self._slots.acquire(blocking=False):
+                metrics.inc("hedged_requests")
+                self._start(hedge, "hedge", outcomes, slot=self._slots)
+                pending += 1
+            else:
+                metrics.inc("hedges_skipped")
+
+        error = None
+        while pending:
+            label, result, exc = first or outcomes.get()
+            first = None
+            pending -= 1
+            if exc is None:
+                if label == "hedge":
+                    metrics.inc("hedge_wins")
+                return result
+            error = exc
+        raise error
+
+    @staticmethod
+    def _start(fn, label, outcomes, slot=None):
+        def attempt():
+            try:
+                outcomes.put((label, fn(), None))
+            except Exception as e:
+                outcomes.put((label, None, e))
+            finally:
+                if slot is not None:
+                    slot.release()
+
+        threading.Thread(target=attempt, name=f"webhook-{label}", daemon=True).start()
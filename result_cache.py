@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import metrics
+from similarity import DEFAULT_THRESHOLD, MinHashIndex
+
+# Default cache settings, each can be overridden by an environment variable
+DEFAULT_CACHE_DIR = ".cache"
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_DISK_MAX_ENTRIES = 5000
+DEFAULT_TTL = 24 * 60 * 60
+# "sqlite" shares results and jobs between worker processes on the host; "memory" keeps them per process
+STORE_BACKENDS = ("sqlite", "memory")
+
+
+def store_backend():
+    """The store backend selected by SLEEP_STORE, defaulting to SQLite."""
+    backend = os.environ.get("SLEEP_STORE", "sqlite").lower()
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f"SLEEP_STORE must be one of {STORE_BACKENDS}")
+    return backend
+
+
+def normalize_input(text):
+    """Normalize user input so trivially different texts share a cache entry."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def cache_key(user_input, locale):
+    """Build the cache key from the normalized input and the locale."""
+    raw = f"{locale}\x00{normalize_input(user_input)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskBackend:
+    """SQLite-backed store so cached analyses survive restarts and are shared between processes."""
+
+    def __init__(self, path, max_entries=DEFAULT_DISK_MAX_ENTRIES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets other worker processes keep reading while one of them writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, data TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def put(self, key, data, created):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, data, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(data, ensure_ascii=False), created, created),
+            )
+            # Evict least recently used rows once the table is over its limit
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                " SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._conn.commit()
+
+
+class ResultCache:
+    """In-memory LRU cache of webhook analyses with TTL and an optional disk tier.
+
+    With a ``similar`` index, an input that misses the exact key falls back
+    to the stored result of a near-duplicate input in the same locale.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, disk=None, similar=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk = disk
+        self.similar = similar
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Create a cache configured from SLEEP_STORE and SLEEP_CACHE_* environment variables."""
+        cache_dir = os.environ.get("SLEEP_CACHE_DIR", DEFAULT_CACHE_DIR)
+        disk = None
+        if cache_dir and store_backend() == "sqlite":
+            disk = DiskBackend(
+                os.path.join(cache_dir, "results.sqlite3"),
+                max_entries=int(os.environ.get("SLEEP_CACHE_DISK_MAX_ENTRIES", DEFAULT_DISK_MAX_ENTRIES)),
+            )
+        # SLEEP_SIMILARITY_THRESHOLD=0 turns near-duplicate matching off
+        threshold = float(os.environ.get("SLEEP_SIMILARITY_THRESHOLD", DEFAULT_THRESHOLD))
+        return cls(
+            max_entries=int(os.environ.get("SLEEP_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            ttl=float(os.environ.get("SLEEP_CACHE_TTL", DEFAULT_TTL)),
+            disk=disk,
+            similar=MinHashIndex(threshold=threshold) if threshold > 0 else None,
+        )
+
+    def _expired(self, created):
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, user_input, locale, allow_stale=False):
+        """Return the cached analysis or None.
+
+        Expired entries are kept until evicted; ``allow_stale=True`` returns
+        them too, as a fallback while the webhook is unavailable.
+        """
+        data = self._lookup(cache_key(user_input, locale), allow_stale)
+        if data is None and self.similar is not None:
+            data = self._lookup_similar(user_input, locale, allow_stale)
+        if allow_stale:
+            metrics.inc("result_cache_stale_hits" if data is not None else "result_cache_stale_misses")
+        else:
+            metrics.inc("result_cache_hits" if data is not None else "result_cache_misses")
+        return data
+
+    def _lookup_similar(self, user_input, locale, allow_stale):
+        key, similarity = self.similar.query(normalize_input(user_input), scope=locale)
+        data = self._lookup(key, allow_stale) if key is not None else None
+        if data is not None:
+            metrics.inc("near_duplicate_hits")
+        elif similarity > 0:
+            # Something similar was indexed but not close enough (or no longer cached)
+            metrics.inc("near_duplicate_near_misses")
+        else:
+            metrics.inc("near_duplicate_misses")
+        return data
+
+    def index(self, user_input, locale):
+        """Make ``user_input`` available for near-duplicate matching without storing a result."""
+        if self.similar is not None:
+            self.similar.add(normalize_input(user_input), cache_key(user_input, locale), scope=locale)
+
+    def _lookup(self, key, allow_stale=False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, data = entry
+                if allow_stale or not self._expired(created):
+                    self._entries.move_to_end(key)
+                    return data
+
+        if self.disk is None:
+            return None
+        stored = self.disk.get(key)
+        if stored is None:
+            return None
+        data, created = stored
+        if self._expired(created) and not allow_stale:
+            return None
+        # Promote disk hits into memory
+        self._remember(key, data, created)
+        return data
+
+    def put(self, user_input, locale, data):
+        key = cache_key(user_input, locale)
+        created = time.time()
+        self._remember(key, data, created)
+        if self.disk is not None:
+            self.disk.put(key, data, created)
+        self.index(user_input, locale)
+
+    def _remember(self, key, data, created):
+        with self._lock:
+            self._entries[key] = (created, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,124 @@
+import hashlib
+import random
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# MinHash signature length and LSH banding; 16 bands of 4 rows find pairs down to roughly 0.5 similarity
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_NGRAM = 3
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_MAX_ENTRIES = 5000
+# Shorter inputs share too few n-grams for the estimate to mean anything
+MIN_CHARS = 60
+# Below this length the threshold rises towards 1: in a short description one edited word is a
+# real difference, while reuse is meant for lightly edited presets
+FULL_THRESHOLD_CHARS = 200
+# Texts whose numbers differ (5 hours -> 8 hours) never match; one edited digit changes too few
+# n-grams for any threshold to tell it from a harmless edit
+NUMBER_PATTERN = re.compile(r"\d+")
+
+_PRIME = (1 << 61) - 1
+
+
+def shingles(text, n=DEFAULT_NGRAM):
+    """Character n-grams of ``text``; works the same for English and Chinese."""
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def text_length(text):
+    """Length of ``text`` with wide (CJK) characters counted twice, as they carry about a word each."""
+    return sum(2 if unicodedata.east_asian_width(char) in "WF" else 1 for char in text)
+
+
+class MinHashIndex:
+    """Locality-sensitive index that finds previously seen texts similar to a new one.
+
+    Texts (already normalized by the caller) are reduced to MinHash
+    signatures over their character n-grams and bucketed by LSH bands.
+    A query only compares signatures that share at least one band and
+    returns the key of the most similar text at or above ``threshold``
+    that has the same numbers; texts shorter than ``FULL_THRESHOLD_CHARS``
+    must be closer still.
+    The index keeps the ``max_entries`` most recently added texts.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS,
+                 ngram=DEFAULT_NGRAM, max_entries=DEFAULT_MAX_ENTRIES, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.ngram = ngram
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self._signatures = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def signature(self, text):
+        hashes = [
+            int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little")
+            for gram in shingles(text, self.ngram)
+        ]
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms)
+
+    def _bands(self, scope, signature):
+        for band in range(self.bands):
+            yield (scope, band, signature[band * self.rows:(band + 1) * self.rows])
+
+    def required_similarity(self, text):
+        """The threshold for ``text``, scaled from ``threshold`` up to 1 as it gets shorter."""
+        return 1 - (1 - self.threshold) * min(1.0, text_length(text) / FULL_THRESHOLD_CHARS)
+
+    def add(self, text, key, scope=""):
+        """Index ``text`` under ``key``; only texts with the same ``scope`` are compared."""
+        if text_length(text) < MIN_CHARS:
+            return
+        signature = self.signature(text)
+        with self._lock:
+            self._discard(key)
+            self._signatures[key] = (scope, signature, NUMBER_PATTERN.findall(text))
+            for band in self._bands(scope, signature):
+                self._buckets.setdefault(band, set()).add(key)
+            while len(self._signatures) > self.max_entries:
+                self._discard(next(iter(self._signatures)))
+
+    def _discard(self, key):
+        entry = self._signatures.pop(key, None)
+        if entry is None:
+            return
+        for band in self._bands(*entry[:2]):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def query(self, text, scope=""):
+        """Return ``(key, similarity)`` of the closest indexed text, or ``(None, best)`` below the threshold."""
+        if text_length(text) < MIN_CHARS:
+            return None, 0.0
+        signature = self.signature(text)
+        numbers = NUMBER_PATTERN.findall(text)
+        with self._lock:
+            candidates = set()
+            for band in self._bands(scope, signature):
+                candidates |= self._buckets.get(band, set())
+            best_key, best, closest = None, 0.0, 0.0
+            for key in candidates:
+                _, other, other_numbers = self._signatures[key]
+                similarity = sum(x == y for x, y in zip(signature, other)) / len(signature)
+                # Texts with other numbers still count as near misses for the metrics
+                closest = max(closest, similarity)
+                if other_numbers == numbers and similarity > best:
+                    best_key, best = key, similarity
+        if best_key is None or best < self.required_similarity(text):
+            return None, closest
+        return best_key, best
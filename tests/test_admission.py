@@ -0,0 +1,68 @@
+import pytest
+
+from admission import AdmissionController, ThrottledError, TokenBucket
+
+
+def test_bucket_spends_burst_then_refills():
+    bucket = TokenBucket(rate=2, burst=3)
+    now = bucket._updated
+    for _ in range(3):
+        assert bucket.wait_time(now) == 0
+        bucket.tokens -= 1
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.5) == 0
+    # Refills never exceed the burst
+    assert bucket.wait_time(now + 100) == 0 and bucket.tokens == 3
+
+
+def test_session_limit_and_retry_after():
+    controller = AdmissionController(session_rate=0.5, session_burst=2, ip_rate=0, global_rate=0)
+    controller.admit("a")
+    controller.admit("a")
+    with pytest.raises(ThrottledError) as refused:
+        controller.admit("a")
+    assert refused.value.scope == "session"
+    assert 0 < refused.value.retry_after <= 2
+    # Other sessions have their own bucket
+    controller.admit("b")
+
+
+def test_refused_call_takes_no_tokens():
+    controller = AdmissionController(session_rate=1, session_burst=5, ip_rate=0, global_rate=0.001, global_burst=1)
+    controller.admit("a")
+    with pytest.raises(ThrottledError) as refused:
+        controller.admit("b")
+    assert refused.value.scope == "global"
+    # The global refusal left b's session bucket full
+    assert controller._buckets[("session", "b")].tokens == 5
+
+
+def test_ip_limit_spans_sessions():
+    controller = AdmissionController(session_rate=0, ip_rate=0.01, ip_burst=2, global_rate=0)
+    controller.admit("a", "10.0.0.1")
+    controller.admit("b", "10.0.0.1")
+    with pytest.raises(ThrottledError) as refused:
+        controller.admit("c", "10.0.0.1")
+    assert refused.value.scope == "ip"
+    controller.admit("c", "10.0.0.2")
+    # Without a known address only the other limits apply
+    controller.admit("d", None)
+
+
+def test_zero_rate_turns_a_limit_off():
+    controller = AdmissionController(session_rate=0, ip_rate=0, global_rate=0)
+    for _ in range(100):
+        controller.admit("a", "10.0.0.1")
+    assert controller.stats() == {"buckets": 0, "global_tokens": None}
+
+
+def test_least_recently_used_buckets_are_forgotten():
+    controller = AdmissionController(session_rate=0.001, session_burst=1, ip_rate=0, global_rate=0, max_buckets=2)
+    controller.admit("a")
+    controller.admit("b")
+    controller.admit("c")
+    assert controller.stats()["buckets"] == 2
+    # "a" was dropped and comes back with a full bucket; "c" is still empty
+    controller.admit("a")
+    with pytest.raises(ThrottledError):
+        controller.admit("c")
@@ -0,0 +1,100 @@
+import io
+import os
+
+import pytest
+import requests
+
+from audio_proxy import AudioCache, AudioFetchError, AudioProxy, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=500-", (500, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    (" bytes=0-0 ", (0, 0)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=1000-",
+    "bytes=5-2",
+    "bytes=-0",
+    "bytes=-",
+    "bytes=0-1,5-6",
+    "items=0-1",
+])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+
+class FakeDrive:
+    """Stands in for the HTTP session, answering every download with ``body``."""
+
+    def __init__(self, body, content_length=True):
+        self.body = body
+        self.content_length = content_length
+        self.downloads = []
+
+    def get(self, url, stream=True, timeout=None):
+        self.downloads.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "audio/mpeg"
+        if self.content_length:
+            response.headers["Content-Length"] = str(len(self.body))
+        response.raw = io.BytesIO(self.body)
+        return response
+
+
+@pytest.fixture
+def proxy(tmp_path):
+    drive = FakeDrive(b"x" * 1000)
+    proxy = AudioProxy(AudioCache(str(tmp_path), max_bytes=2500, session=drive), port=0).start()
+    yield proxy, drive
+    proxy.server.shutdown()
+    proxy.server.server_close()
+
+
+def test_serves_only_tracks_from_results(proxy):
+    proxy, drive = proxy
+    assert requests.get(f"{proxy.public_url}/audio/unlisted").status_code == 404
+    assert not drive.downloads
+
+    url = proxy.url_for("track")
+    full = requests.get(url)
+    assert full.status_code == 200 and full.content == b"x" * 1000
+    part = requests.get(url, headers={"Range": "bytes=-10"})
+    assert part.status_code == 206 and part.headers["Content-Range"] == "bytes 990-999/1000"
+    assert len(drive.downloads) == 1
+
+
+def test_least_recently_used_tracks_are_evicted(proxy):
+    proxy, drive = proxy
+    cache = proxy.cache
+    paths = [cache.get(file_id) for file_id in ("a", "b")]
+    os.utime(paths[0], (1, 1))
+    os.utime(paths[1], (2, 2))
+    cache.get("c")
+    assert not os.path.exists(paths[0]) and os.path.exists(paths[1])
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_track_larger_than_cache_is_refused(tmp_path, content_length):
+    cache = AudioCache(str(tmp_path), max_bytes=500, session=FakeDrive(b"x" * 1000, content_length))
+    with pytest.raises(AudioFetchError):
+        cache.get("huge")
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("huge.audio")]
+
+
+def test_missing_file_answers_502(proxy, monkeypatch):
+    proxy, drive = proxy
+    url = proxy.url_for("track")
+    monkeypatch.setattr(proxy.cache, "get", lambda file_id: proxy.cache.path(file_id))
+    assert requests.get(url).status_code == 502
@@ -0,0 +1,111 @@
+import argparse
+import json
+
+import pytest
+
+import batch
+from webhook import WebhookHTTPError
+
+TRACK = "https://drive.google.com/file/d/abcdefghijklmnopqrstuvwxyz0123456/view"
+
+
+def write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def test_read_rows_skips_unusable_lines(tmp_path, capsys):
+    path = tmp_path / "input.jsonl"
+    write_lines(path, [
+        json.dumps({"id": "a", "user_input": "can't sleep", "locale": "en"}),
+        '["not", "an", "object"]',
+        "{broken",
+        "",
+        json.dumps({"text": "睡不著"}),
+        json.dumps({"id": "b", "user_input": "   "}),
+    ])
+    assert list(batch.read_rows(path)) == [("a", "can't sleep", "en"), ("5", "睡不著", None)]
+    errors = capsys.readouterr().err
+    assert "line 2: not a JSON object" in errors
+    assert "line 3: not valid JSON" in errors
+    assert "line 6: no user_input" in errors
+
+
+def test_finished_ids_ignores_failures_and_torn_lines(tmp_path):
+    path = tmp_path / "output.jsonl"
+    assert batch.finished_ids(path) == set()
+    path.write_text(
+        json.dumps({"id": "a", "result": "ok"}) + "\n"
+        + json.dumps({"id": 2, "result": "ok"}) + "\n"
+        + json.dumps({"id": "b", "error": "HTTP 503"}) + "\n"
+        + "[1, 2]\n"
+        + '{"id": "c", "res',
+        encoding="utf-8",
+    )
+    assert batch.finished_ids(path) == {"a", "2"}
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    """Answers every input with a track link, except inputs listed in ``failing``."""
+    calls, failing = [], set()
+
+    def fetch_analysis(user_input, timeout=None, session=None):
+        calls.append(user_input)
+        if user_input in failing:
+            raise WebhookHTTPError(503)
+        return {"result": f"{user_input} {TRACK}"}
+
+    monkeypatch.setattr(batch, "fetch_analysis", fetch_analysis)
+    monkeypatch.setattr(batch, "build_session_from_env", lambda: None)
+    return calls, failing
+
+
+def run(tmp_path, output):
+    args = argparse.Namespace(
+        input=str(tmp_path / "input.jsonl"), output=str(output), concurrency=2, rate=0,
+        locale="en", timeout=1, populate_cache=False,
+    )
+    return batch.run(args)
+
+
+def test_rerun_resumes_and_retries_failures(tmp_path, webhook):
+    calls, failing = webhook
+    write_lines(tmp_path / "input.jsonl", [json.dumps({"id": i, "user_input": f"row {i}"}) for i in range(4)])
+    output = tmp_path / "output.jsonl"
+    failing.add("row 2")
+    assert run(tmp_path, output) == 1
+    records = {record["id"]: record for record in read_records(output)}
+    assert records["2"]["error"] == "HTTP 503"
+    assert records["0"]["drive_ids"] == ["abcdefghijklmnopqrstuvwxyz0123456"]
+
+    calls.clear()
+    failing.clear()
+    assert run(tmp_path, output) == 0
+    assert calls == ["row 2"]
+    assert batch.finished_ids(output) == {"0", "1", "2", "3"}
+
+
+def test_resume_after_a_torn_last_line(tmp_path, webhook):
+    calls, _ = webhook
+    write_lines(tmp_path / "input.jsonl", [json.dumps({"id": "a", "user_input": "row a"})])
+    output = tmp_path / "output.jsonl"
+    output.write_text('{"id": "a", "res', encoding="utf-8")
+    assert run(tmp_path, output) == 0
+    assert calls == ["row a"]
+    # The new record starts on its own line
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == '{"id": "a", "res' and json.loads(lines[1])["id"] == "a"
+
+
+def test_duplicate_ids_run_once(tmp_path, webhook):
+    calls, _ = webhook
+    write_lines(tmp_path / "input.jsonl", [
+        json.dumps({"id": "a", "user_input": "first"}),
+        json.dumps({"id": "a", "user_input": "second"}),
+    ])
+    assert run(tmp_path, tmp_path / "output.jsonl") == 0
+    assert calls == ["first"]
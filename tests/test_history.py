@@ -0,0 +1,62 @@
+from history import SESSION_OVERHEAD, AnalysisHistory, HistoryEntry
+
+RESULT = "Try a wind-down routine. https://drive.google.com/file/d/abcdefghijklmnopqrstuvwxyz0123456/view"
+
+
+def test_entries_newest_first_and_compressed():
+    history = AnalysisHistory()
+    first = history.add("s", "input one", "en", RESULT, seconds=1.5, source=None)
+    second = history.add("s", "input two", "en", RESULT * 20)
+    assert history.entries("s") == [second, first]
+    assert second.result == RESULT * 20 and len(second._result) < len(RESULT * 20)
+    assert first.drive_ids == ("abcdefghijklmnopqrstuvwxyz0123456",)
+    assert history.entries("other") == []
+
+
+def test_max_entries_evicts_oldest():
+    history = AnalysisHistory(max_entries=2)
+    entries = [history.add("s", f"input {i}", "en", RESULT) for i in range(3)]
+    assert history.entries("s") == [entries[2], entries[1]]
+    assert history.stats()["entries"] == 2
+
+
+def test_session_bytes_evicts_oldest():
+    size = HistoryEntry("input 0", "en", RESULT).size
+    history = AnalysisHistory(session_bytes=SESSION_OVERHEAD + 2 * size + size // 2)
+    entries = [history.add("s", f"input {i}", "en", RESULT) for i in range(3)]
+    assert history.entries("s") == [entries[2], entries[1]]
+
+
+def test_total_bytes_evicts_least_recently_active_session():
+    size = HistoryEntry("input 0", "en", RESULT).size
+    history = AnalysisHistory(total_bytes=3 * (SESSION_OVERHEAD + size))
+    history.add("a", "input a", "en", RESULT)
+    history.add("b", "input b", "en", RESULT)
+    history.add("c", "input c", "en", RESULT)
+    # Reading a session counts as activity, so "b" is now the idlest
+    history.entries("a")
+    history.add("d", "input d", "en", RESULT)
+    assert history.entries("b") == []
+    assert all(history.entries(session) for session in "acd")
+    assert history.stats()["sessions"] == 3
+    assert history.stats()["bytes"] <= history.total_bytes
+
+
+def test_oversized_entry_is_rejected():
+    history = AnalysisHistory(session_bytes=SESSION_OVERHEAD + 100)
+    assert history.add("s", "input", "en", RESULT) is None
+    assert history.stats() == {"sessions": 0, "entries": 0, "bytes": 0}
+
+
+def test_disabled_history_keeps_nothing():
+    history = AnalysisHistory(max_entries=0)
+    assert history.add("s", "input", "en", RESULT) is None
+    assert history.entries("s") == []
+
+
+def test_bytes_return_to_zero_when_sessions_empty():
+    history = AnalysisHistory(max_entries=1)
+    history.add("s", "input 1", "en", RESULT)
+    history.add("s", "input 2", "en", RESULT)
+    entry = history.entries("s")[0]
+    assert history.stats()["bytes"] == SESSION_OVERHEAD + entry.size
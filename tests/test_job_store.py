@@ -0,0 +1,112 @@
+import threading
+
+import pytest
+
+from job_store import MemoryJobStore, SQLiteJobStore, shareable, wait_for_claim, wait_for_job
+from jobs import JobCancelled
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def create(store, *job_ids):
+    for job_id in job_ids:
+        store.create(job_id, "I wake up at 3 am", "en")
+
+
+def test_create_finish_get(store):
+    create(store, "a")
+    assert store.get("a")["state"] == "pending"
+    store.finish("a", {"result": "ok"})
+    assert store.get("a") == {"id": "a", "user_input": "I wake up at 3 am", "locale": "en",
+                              "state": "done", "result": {"result": "ok"}}
+    assert store.get("missing") is None
+
+
+def test_pending_holder_keeps_the_claim(store):
+    create(store, "a", "b")
+    assert store.claim("k", "a") == "a"
+    assert store.claim("k", "b") == "a"
+    assert store.claim("other", "b") == "b"
+
+
+def test_finish_releases_the_claim(store):
+    create(store, "a", "b")
+    store.claim("k", "a")
+    store.finish("a", {"result": "ok"})
+    assert store.claim("k", "b") == "b"
+
+
+@pytest.mark.parametrize("state", ["done", "cancelled"])
+def test_finished_holder_has_no_live_claim(store, state):
+    create(store, "a", "b")
+    store.claim("k", "a")
+    # A holder recorded as finished no longer blocks the key, whatever happened to its claim row
+    store.claim("k2", "a")
+    store.finish("a", None, state=state)
+    assert store.claim("k2", "b") == "b"
+
+
+def test_expired_lease_frees_the_claim(tmp_path):
+    for store in (MemoryJobStore(lease=0), SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), lease=0)):
+        create(store, "a", "b")
+        store.claim("k", "a")
+        assert store.claim("k", "b") == "b"
+
+
+@pytest.mark.parametrize("result, expected", [
+    ({"result": "analysis"}, True),
+    ({"result": "analysis", "source": "cache"}, True),
+    ({"result": "boom", "error": True}, False),
+    ({"result": "keywords", "source": "local"}, False),
+    ({"result": "old", "source": "stale"}, False),
+    (None, False),
+])
+def test_shareable(result, expected):
+    assert shareable(result) is expected
+
+
+def test_wait_for_claim_shares_a_real_analysis(store):
+    create(store, "a", "b")
+    store.claim("k", "a")
+    threading.Timer(0.05, store.finish, args=("a", {"result": "analysis"})).start()
+    assert wait_for_claim(store, "k", "b", poll_interval=0.01) == {"result": "analysis"}
+
+
+@pytest.mark.parametrize("result", [
+    {"result": "boom", "error": True},
+    {"result": "keywords", "source": "local"},
+    {"result": "old", "source": "stale"},
+])
+def test_wait_for_claim_runs_itself_after_a_failed_holder(store, result):
+    create(store, "a", "b")
+    store.claim("k", "a")
+    threading.Timer(0.05, store.finish, args=("a", result)).start()
+    assert wait_for_claim(store, "k", "b", poll_interval=0.01) is None
+    assert store.claim("k", "c") == "b"
+
+
+def test_wait_for_claim_cancelled(store):
+    create(store, "a", "b")
+    store.claim("k", "a")
+    with pytest.raises(JobCancelled):
+        wait_for_claim(store, "k", "b", cancelled=lambda: True, poll_interval=0.01)
+
+
+def test_wait_for_job(store):
+    create(store, "a", "b")
+    threading.Timer(0.05, store.finish, args=("a", {"result": "analysis"})).start()
+    assert wait_for_job(store, "a", poll_interval=0.01) == {"result": "analysis"}
+    store.finish("b", None, state="cancelled")
+    assert wait_for_job(store, "b", poll_interval=0.01) is None
+    assert wait_for_job(store, "missing", poll_interval=0.01) is None
+
+
+def test_wait_for_job_gives_up_after_the_lease():
+    store = MemoryJobStore(lease=0.05)
+    create(store, "a")
+    assert wait_for_job(store, "a", poll_interval=0.01) is None
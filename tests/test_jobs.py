@@ -0,0 +1,156 @@
+import threading
+
+import pytest
+
+from jobs import JobQueue, QueueFullError
+
+
+def blocking_job(started, release):
+    def fn(job):
+        started.set()
+        release.wait(5)
+        return "blocked"
+    return fn
+
+
+def test_queue_rejects_past_capacity():
+    queue = JobQueue(max_workers=1, max_queued=1)
+    started, release = threading.Event(), threading.Event()
+    running = queue.submit(blocking_job(started, release))
+    assert started.wait(5)
+
+    queued = queue.submit(lambda job: "queued")
+    assert queue.position(queued) == 1
+    with pytest.raises(QueueFullError):
+        queue.submit(lambda job: "rejected")
+
+    release.set()
+    assert running.wait(5) and queued.wait(5)
+    assert (running.result, queued.result) == ("blocked", "queued")
+
+
+def test_idle_workers_do_not_count_against_the_queue():
+    queue = JobQueue(max_workers=2, max_queued=0)
+    started, release = threading.Event(), threading.Event()
+    job = queue.submit(blocking_job(started, release))
+    assert started.wait(5)
+    other = queue.submit(lambda job: "second")
+    assert other.wait(5) and other.result == "second"
+    release.set()
+    assert job.wait(5)
+
+
+def test_same_key_shares_one_job():
+    queue = JobQueue(max_workers=1, max_queued=4)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    admitted = []
+
+    def fn(job):
+        calls.append(job.id)
+        started.set()
+        release.wait(5)
+        return "shared"
+
+    first = queue.submit(fn, key="k", watcher="a", admit=lambda: admitted.append("a"))
+    assert started.wait(5)
+    second = queue.submit(fn, key="k", watcher="b", admit=lambda: admitted.append("b"))
+    assert second is first
+    assert first.watchers == {"a", "b"}
+    # Only the call that queues a new job is admitted
+    assert admitted == ["a"]
+
+    release.set()
+    assert first.wait(5)
+    assert calls == [first.id] and first.result == "shared"
+
+    # Once finished, the key starts a fresh job
+    third = queue.submit(lambda job: "again", key="k")
+    assert third is not first
+    assert third.wait(5) and third.result == "again"
+
+
+def test_refused_admission_queues_nothing():
+    queue = JobQueue(max_workers=1, max_queued=1)
+
+    def refuse():
+        raise RuntimeError("throttled")
+
+    with pytest.raises(RuntimeError):
+        queue.submit(lambda job: None, key="k", admit=refuse)
+    assert queue.stats()["queued"] == 0 and queue.stats()["inflight_keys"] == 0
+
+
+def test_orphaned_queued_job_is_cancelled():
+    alive = {"a", "b"}
+    queue = JobQueue(max_workers=1, max_queued=4, is_alive=lambda watcher: watcher in alive, orphan_grace=0)
+    started, release = threading.Event(), threading.Event()
+    running = queue.submit(blocking_job(started, release), watcher="a")
+    assert started.wait(5)
+    orphan = queue.submit(lambda job: "never", key="k", watcher="b")
+
+    alive.discard("b")
+    # Any submit sweeps disconnected watchers first
+    queue.submit(lambda job: "other", watcher="a")
+    assert orphan.done() and orphan.cancelled()
+    assert orphan.state == "cancelled" and orphan.result is None
+    assert queue.attach(orphan.id, "c") is None
+
+    release.set()
+    assert running.wait(5) and running.result == "blocked"
+
+
+def test_orphaned_running_job_stops_at_next_publish():
+    alive = {"a"}
+    queue = JobQueue(max_workers=1, max_queued=4, is_alive=lambda watcher: watcher in alive, orphan_grace=0)
+    started, release = threading.Event(), threading.Event()
+    published = []
+
+    def fn(job):
+        started.set()
+        release.wait(5)
+        job.publish("partial")
+        published.append(True)
+        return "finished"
+
+    job = queue.submit(fn, watcher="a")
+    assert started.wait(5)
+    alive.clear()
+    queue.submit(lambda job: None)
+    assert job.cancelled() and not job.done()
+
+    release.set()
+    assert job.wait(5)
+    assert job.state == "cancelled" and job.result is None and not published
+
+
+def test_release_cancels_only_without_other_watchers():
+    queue = JobQueue(max_workers=1, max_queued=4)
+    started, release = threading.Event(), threading.Event()
+    queue.submit(blocking_job(started, release))
+    assert started.wait(5)
+    job = queue.submit(lambda job: "result", key="k", watcher="a")
+    queue.submit(lambda job: "result", key="k", watcher="b")
+
+    queue.release(job, "a")
+    assert not job.cancelled()
+    queue.release(job, "b")
+    assert job.cancelled() and job.done()
+    release.set()
+
+
+def test_wait_for_update_wakes_on_publish():
+    queue = JobQueue(max_workers=1, max_queued=1)
+    step = threading.Event()
+
+    def fn(job):
+        job.publish("one")
+        step.wait(5)
+        return "done"
+
+    job = queue.submit(fn)
+    assert job.wait_for_update(0, timeout=5)
+    assert job.version == 1 and job.partial == "one"
+    step.set()
+    assert job.wait_for_update(job.version, timeout=5) and job.done()
+
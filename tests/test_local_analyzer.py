@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from local_analyzer import THEMES, LocalAnalyzer, local_fallback_enabled, local_preview_enabled
+from locales import LANGUAGE_NAMES, load_catalog
+
+
+@pytest.mark.parametrize("locale", list(LANGUAGE_NAMES))
+def test_presets_classify_as_their_theme(locale):
+    analyzer = LocalAnalyzer()
+    presets = list(load_catalog(locale)["presets"].values())
+    assert [analyzer.classify(preset) for preset in presets] == list(THEMES)
+
+
+@pytest.mark.parametrize("text, theme", [
+    ("My mind keeps racing about a deadline", "stress"),
+    ("夜班之後日夜顛倒", "irregular_schedule"),
+    ("I feel EXHAUSTED and drained", "fatigue"),
+    # Whole words only: "workout" is not "work"
+    ("after my workout I feel tired", "fatigue"),
+    ("", THEMES[0]),
+    ("nothing matches here", THEMES[0]),
+])
+def test_classify(text, theme):
+    assert LocalAnalyzer().classify(text) == theme
+
+
+def test_ties_go_to_the_first_theme():
+    assert LocalAnalyzer().classify("stress and tired") == "stress"
+
+
+def test_analyze_links_configured_track_first():
+    analyzer = LocalAnalyzer(tracks={"stress": "configured"})
+    data = analyzer.analyze("anxious", "en", track_id="fallback")
+    assert data["source"] == "local" and data["theme"] == "stress"
+    assert data["result"].startswith(load_catalog("en")["local_analyses"]["stress"])
+    assert "/file/d/configured/" in data["result"]
+    assert "/file/d/fallback/" in analyzer.analyze("tired", "en", track_id="fallback")["result"]
+    assert "drive.google.com" not in analyzer.analyze("tired", "en")["result"]
+
+
+def test_from_env_reads_tracks(tmp_path, monkeypatch):
+    path = tmp_path / "tracks.json"
+    path.write_text(json.dumps({"fatigue": "abc"}), encoding="utf-8")
+    monkeypatch.setenv("SLEEP_LOCAL_TRACKS", str(path))
+    assert LocalAnalyzer.from_env().tracks == {"fatigue": "abc"}
+
+
+def test_switches(monkeypatch):
+    monkeypatch.delenv("SLEEP_LOCAL_FALLBACK", raising=False)
+    monkeypatch.delenv("SLEEP_LOCAL_PREVIEW", raising=False)
+    assert local_fallback_enabled() and not local_preview_enabled()
+    monkeypatch.setenv("SLEEP_LOCAL_FALLBACK", "no")
+    monkeypatch.setenv("SLEEP_LOCAL_PREVIEW", "true")
+    assert not local_fallback_enabled() and local_preview_enabled()
@@ -0,0 +1,33 @@
+import socket
+
+import requests
+
+from metrics import MetricsRegistry, start_server
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_taken_port_moves_to_the_next_one():
+    port = free_port()
+    registries = [MetricsRegistry(), MetricsRegistry()]
+    registries[1].inc("second_process")
+    servers = [start_server(port, registry=registry) for registry in registries]
+    try:
+        assert servers[1].server_port > servers[0].server_port == port
+        text = requests.get(f"http://127.0.0.1:{servers[1].server_port}/metrics").text
+        assert "second_process" in text
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+def test_no_free_port_is_not_fatal():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        s.listen()
+        assert start_server(s.getsockname()[1], attempts=1) is None
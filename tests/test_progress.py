@@ -0,0 +1,43 @@
+import pytest
+
+from progress import MAX_PROGRESS, LatencyEstimator, display_eta
+
+
+def test_prior_until_samples_arrive():
+    estimator = LatencyEstimator(prior=30)
+    assert estimator.percentile(90) == 30
+    assert estimator.estimate(10) == (0, 20)
+    assert estimator.estimate(30) == (MAX_PROGRESS, None)
+
+
+def test_progress_is_share_of_finished_samples():
+    estimator = LatencyEstimator()
+    for seconds in (10, 20, 30, 40):
+        estimator.record(seconds)
+    assert estimator.estimate(5) == (0, 25)
+    # Half finished by 25 s; the median of the remaining two is 40
+    assert estimator.estimate(25) == (0.5, 15)
+    assert estimator.estimate(40) == (MAX_PROGRESS, None)
+    assert estimator.percentile(90) == 40
+    assert estimator.percentile(0) == 10
+
+
+def test_window_drops_oldest_samples():
+    estimator = LatencyEstimator(window=2)
+    for seconds in (100, 10, 20):
+        estimator.record(seconds)
+    assert estimator.percentile(100) == 20
+    assert estimator.estimate(15) == (0.5, 5)
+
+
+@pytest.mark.parametrize("eta, expected", [
+    (None, None),
+    (0.1, 1),
+    (3.4, 3),
+    (9.6, 10),
+    (12, 10),
+    (13, 15),
+    (61, 60),
+])
+def test_display_eta(eta, expected):
+    assert display_eta(eta) == expected
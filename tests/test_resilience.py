@@ -0,0 +1,88 @@
+import time
+
+import pytest
+import requests
+
+from jobs import JobCancelled
+from resilience import CircuitBreaker, CircuitOpenError
+from webhook import WebhookHTTPError, WebhookParseError
+
+
+def fail(error):
+    def fn():
+        raise error
+    return fn
+
+
+def trip(breaker, times):
+    for _ in range(times):
+        with pytest.raises(requests.ConnectionError):
+            breaker.call(fail(requests.ConnectionError("down")))
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    trip(breaker, 2)
+    assert breaker.state == CircuitBreaker.CLOSED and not breaker.is_open()
+    trip(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.is_open()
+
+    called = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: called.append(True))
+    assert not called
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    trip(breaker, 1)
+    assert breaker.call(lambda: "ok") == "ok"
+    trip(breaker, 1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_probe_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    trip(breaker, 1)
+    time.sleep(0.06)
+    assert not breaker.is_open()
+
+    def probe():
+        # Only the probe gets through while it is in flight
+        assert breaker.state == CircuitBreaker.HALF_OPEN and breaker.is_open()
+        assert not breaker.allow()
+        return "ok"
+
+    assert breaker.call(probe) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0}
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    trip(breaker, 3)
+    time.sleep(0.06)
+    trip(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.is_open()
+
+
+def test_only_upstream_failures_count():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    # A 4xx or an unparsable body means the upstream answered
+    for error in (WebhookHTTPError(404), WebhookParseError("<html>")):
+        with pytest.raises(type(error)):
+            breaker.call(fail(error))
+        assert breaker.state == CircuitBreaker.CLOSED
+    with pytest.raises(WebhookHTTPError):
+        breaker.call(fail(WebhookHTTPError(503)))
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_probe_without_an_answer_lets_the_next_call_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    trip(breaker, 1)
+    time.sleep(0.06)
+    with pytest.raises(JobCancelled):
+        breaker.call(fail(JobCancelled()))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from result_cache import DiskBackend, ResultCache, cache_key, normalize_input, store_backend
+
+
+@pytest.mark.parametrize("a, b", [
+    ("I can't sleep", "  i CAN'T\tsleep \n"),
+    ("ＡＢＣ　睡不著", "abc 睡不著"),
+    (None, ""),
+])
+def test_normalization_shares_keys(a, b):
+    assert normalize_input(a) == normalize_input(b)
+    assert cache_key(a, "en") == cache_key(b, "en")
+
+
+def test_locale_is_part_of_the_key():
+    assert cache_key("tired", "en") != cache_key("tired", "zh-TW")
+
+
+def test_memory_lru():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", "en", {"result": "A"})
+    cache.put("b", "en", {"result": "B"})
+    assert cache.get("a", "en") == {"result": "A"}
+    cache.put("c", "en", {"result": "C"})
+    # "b" was the least recently used
+    assert cache.get("b", "en") is None
+    assert cache.get(" A ", "en") == {"result": "A"}
+
+
+def test_expired_entries_only_served_stale(monkeypatch):
+    cache = ResultCache(ttl=10)
+    cache.put("a", "en", {"result": "A"})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get("a", "en") is None
+    assert cache.get("a", "en", allow_stale=True) == {"result": "A"}
+
+
+def test_zero_ttl_never_expires(monkeypatch):
+    cache = ResultCache(ttl=0)
+    cache.put("a", "en", {"result": "A"})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 10 ** 9)
+    assert cache.get("a", "en") == {"result": "A"}
+
+
+def test_disk_tier_survives_restarts(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    ResultCache(disk=DiskBackend(path)).put("睡不著", "zh-TW", {"result": "失眠"})
+    cache = ResultCache(disk=DiskBackend(path))
+    assert cache.get("睡不著", "zh-TW") == {"result": "失眠"}
+    # Promoted into memory
+    assert cache._entries
+
+
+def test_expired_disk_entries_only_served_stale(tmp_path, monkeypatch):
+    disk = DiskBackend(str(tmp_path / "results.sqlite3"))
+    disk.put(cache_key("a", "en"), {"result": "A"}, time.time() - 100)
+    cache = ResultCache(ttl=10, disk=disk)
+    assert cache.get("a", "en") is None
+    assert cache.get("a", "en", allow_stale=True) == {"result": "A"}
+
+
+def test_disk_evicts_least_recently_accessed(tmp_path):
+    disk = DiskBackend(str(tmp_path / "results.sqlite3"), max_entries=2)
+    disk.put("a", {"result": "A"}, 1)
+    disk.put("b", {"result": "B"}, 2)
+    disk._conn.execute("UPDATE results SET accessed = 3 WHERE key = 'a'")
+    disk.put("c", {"result": "C"}, 4)
+    assert disk.get("b") is None
+    assert disk.get("a") == ({"result": "A"}, 1)
+    disk.delete("a")
+    assert disk.get("a") is None
+
+
+def test_store_backend(monkeypatch):
+    monkeypatch.delenv("SLEEP_STORE", raising=False)
+    assert store_backend() == "sqlite"
+    monkeypatch.setenv("SLEEP_STORE", "Memory")
+    assert store_backend() == "memory"
+    monkeypatch.setenv("SLEEP_STORE", "redis")
+    with pytest.raises(ValueError):
+        store_backend()
+
+
+def test_from_env_memory_store_has_no_disk(tmp_path, monkeypatch):
+    monkeypatch.setenv("SLEEP_STORE", "memory")
+    monkeypatch.setenv("SLEEP_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("SLEEP_SIMILARITY_THRESHOLD", "0")
+    cache = ResultCache.from_env()
+    assert cache.disk is None and cache.similar is None
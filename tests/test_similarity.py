@@ -0,0 +1,67 @@
+import pytest
+
+from locales import load_catalog
+from result_cache import normalize_input
+from similarity import FULL_THRESHOLD_CHARS, MIN_CHARS, MinHashIndex, text_length
+
+PRESET = normalize_input(list(load_catalog("en")["presets"].values())[0])
+SHORT = normalize_input("Lately I only sleep about 5 hours a night and feel tired at work all day long.")
+
+
+def test_text_length_counts_wide_characters_twice():
+    assert text_length("sleep") == 5
+    assert text_length("睡不著") == 6
+    assert text_length("ＡＢ") == 4
+
+
+def test_required_similarity_rises_for_short_texts():
+    index = MinHashIndex(threshold=0.8)
+    assert index.required_similarity("x" * FULL_THRESHOLD_CHARS) == pytest.approx(0.8)
+    assert index.required_similarity("x" * (FULL_THRESHOLD_CHARS * 2)) == pytest.approx(0.8)
+    assert index.required_similarity("x" * (FULL_THRESHOLD_CHARS // 2)) == pytest.approx(0.9)
+    # Wide characters reach the full threshold at half the count
+    assert index.required_similarity("睡" * (FULL_THRESHOLD_CHARS // 2)) == pytest.approx(0.8)
+
+
+def test_lightly_edited_preset_matches():
+    index = MinHashIndex()
+    index.add(PRESET, "preset")
+    key, similarity = index.query(PRESET.replace("at least an hour", "at least one hour"))
+    assert key == "preset" and similarity >= 0.8
+
+
+def test_one_edited_number_in_a_short_text_does_not_match():
+    index = MinHashIndex()
+    index.add(SHORT, "short")
+    assert index.query(SHORT)[0] == "short"
+    key, similarity = index.query(SHORT.replace("5 hours", "8 hours"))
+    assert key is None and similarity > 0
+
+
+def test_other_numbers_never_match_even_in_long_texts():
+    index = MinHashIndex()
+    index.add(PRESET + " i sleep 5 hours.", "five")
+    key, similarity = index.query(PRESET + " i sleep 8 hours.")
+    assert key is None and similarity >= 0.8
+
+
+def test_texts_below_min_chars_are_ignored():
+    text = "x" * (MIN_CHARS - 1)
+    index = MinHashIndex()
+    index.add(text, "tiny")
+    assert index.query(text) == (None, 0.0)
+
+
+def test_scopes_are_separate():
+    index = MinHashIndex()
+    index.add(PRESET, "en", scope="en")
+    assert index.query(PRESET, scope="zh-TW") == (None, 0.0)
+    assert index.query(PRESET, scope="en")[0] == "en"
+
+
+def test_oldest_texts_are_dropped():
+    index = MinHashIndex(max_entries=1)
+    index.add(PRESET, "first")
+    index.add(SHORT, "second")
+    assert index.query(PRESET)[0] is None
+    assert index.query(SHORT)[0] == "second"
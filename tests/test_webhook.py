@@ -0,0 +1,166 @@
+import gzip
+import io
+import json
+
+import pytest
+import requests
+from urllib3.response import HTTPResponse
+
+import webhook
+from webhook import (GZIP_MIN_BYTES, WebhookParseError, WebhookResponseTooLarge, _charset, _parse_json,
+                     _read_chunks, _read_events, fetch_analysis)
+
+
+def response(body, content_type, chunk_size=None, status=200, headers=None):
+    """A requests response reading ``body`` from memory, optionally split into ``chunk_size`` byte pieces."""
+    resp = requests.Response()
+    resp.status_code = status
+    resp.headers["Content-Type"] = content_type
+    resp.headers.update(headers or {})
+    resp.raw = HTTPResponse(body=io.BytesIO(body), headers=resp.headers, preload_content=False, decode_content=False)
+    if chunk_size:
+        # Split multi-byte characters across reads, as a network would
+        pieces = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        resp.iter_content = lambda chunk_size=None: iter(pieces)
+    return resp
+
+
+@pytest.mark.parametrize("content_type, expected", [
+    ("application/json", "utf-8"),
+    ("text/event-stream", "utf-8"),
+    ("text/plain; charset=utf-8", "utf-8"),
+    ('text/plain; charset="Big5"', "big5"),
+    ("text/plain; charset=latin-1", "iso8859-1"),
+    ("text/plain; charset=no-such-codec", "utf-8"),
+])
+def test_charset(content_type, expected):
+    assert _charset(response(b"", content_type)) == expected
+
+
+def test_json_without_charset_is_utf8():
+    body = json.dumps({"result": "睡眠 ☾ sleep"}, ensure_ascii=False).encode("utf-8")
+    assert _parse_json(response(body, "application/json")) == {"result": "睡眠 ☾ sleep"}
+
+
+def test_json_in_declared_charset():
+    body = json.dumps({"result": "失眠"}, ensure_ascii=False).encode("big5")
+    assert _parse_json(response(body, "application/json; charset=big5")) == {"result": "失眠"}
+
+
+def test_parse_error_echoes_the_body():
+    with pytest.raises(WebhookParseError) as error:
+        _parse_json(response("<html>錯誤</html>".encode("utf-8"), "text/html"))
+    assert error.value.text == "<html>錯誤</html>"
+
+
+def test_plain_text_stream_decodes_split_characters():
+    body = "失眠 wakes me at 3 am".encode("utf-8")
+    seen = []
+    assert _read_chunks(response(body, "text/plain", chunk_size=1), seen.append) == "失眠 wakes me at 3 am"
+    assert "�" not in "".join(seen)
+
+
+def test_events_decode_utf8_and_keep_whitespace():
+    body = (
+        'data: 失眠\n\n'
+        'data: Hello\n\n'
+        'data:  world\n\n'
+        'data: 42\n\n'
+        'data: {"delta": "，好"}\n\n'
+        ': comment\n\n'
+        'data: [DONE]\n\n'
+        'data: ignored\n\n'
+    ).encode("utf-8")
+    seen = []
+    text = _read_events(response(body, "text/event-stream", chunk_size=3), seen.append)
+    assert text == "失眠Hello world42，好"
+    assert seen[-1] == text
+
+
+def test_events_result_replaces_streamed_text():
+    body = b'data: {"delta": "draft"}\r\n\r\ndata: {"result": "final"}\r\n\r\n'
+    assert _read_events(response(body, "text/event-stream"), lambda text: None) == "final"
+
+
+class Upstream:
+    """Records posted requests and answers them from ``replies``, a function of the request headers."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.requests = []
+
+    def post(self, url, data=None, headers=None, timeout=None, stream=False):
+        self.requests.append((headers, data))
+        return self.replies(headers)
+
+
+def ok(headers=None):
+    return response(b'{"result": "ok"}', "application/json", headers=headers)
+
+
+LONG_INPUT = "I wake up at 3 am. " * (GZIP_MIN_BYTES // 10)
+
+
+@pytest.fixture(autouse=True)
+def forget_gzip_support(monkeypatch):
+    monkeypatch.setattr(webhook, "_gzip_support", {})
+    monkeypatch.delenv("SLEEP_GZIP_REQUESTS", raising=False)
+
+
+def test_gzip_after_upstream_advertises_it():
+    upstream = Upstream(lambda headers: ok({"Accept-Encoding": "gzip"}))
+    for _ in range(2):
+        assert fetch_analysis(LONG_INPUT, session=upstream, url="http://upstream/a") == {"result": "ok"}
+    (first, plain), (second, compressed) = upstream.requests
+    assert "Content-Encoding" not in first and json.loads(plain) == {"user_input": LONG_INPUT}
+    assert second["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(compressed)) == {"user_input": LONG_INPUT}
+    # Short bodies are never worth compressing
+    fetch_analysis("tired", session=upstream, url="http://upstream/a")
+    assert "Content-Encoding" not in upstream.requests[-1][0]
+
+
+def test_415_resends_plainly_and_stops_compressing(monkeypatch):
+    monkeypatch.setenv("SLEEP_GZIP_REQUESTS", "1")
+    upstream = Upstream(lambda headers: response(b"", "text/plain", status=415) if "Content-Encoding" in headers
+                        else ok())
+    assert fetch_analysis(LONG_INPUT, session=upstream, url="http://upstream/b") == {"result": "ok"}
+    assert [headers.get("Content-Encoding") for headers, _ in upstream.requests] == ["gzip", None]
+    fetch_analysis(LONG_INPUT, session=upstream, url="http://upstream/b")
+    assert len(upstream.requests) == 3 and "Content-Encoding" not in upstream.requests[-1][0]
+
+
+def test_gzip_off_never_compresses(monkeypatch):
+    monkeypatch.setenv("SLEEP_GZIP_REQUESTS", "0")
+    upstream = Upstream(lambda headers: ok({"Accept-Encoding": "gzip"}))
+    for _ in range(2):
+        fetch_analysis(LONG_INPUT, session=upstream, url="http://upstream/c")
+    assert all("Content-Encoding" not in headers for headers, _ in upstream.requests)
+
+
+def test_declared_oversized_body_is_refused_unread(monkeypatch):
+    monkeypatch.setattr(webhook, "MAX_RESPONSE_BYTES", 100)
+    body = io.BytesIO(b"x" * 101)
+    resp = response(b"", "application/json", headers={"Content-Length": "101"})
+    resp.raw = HTTPResponse(body=body, headers=resp.headers, preload_content=False)
+    with pytest.raises(WebhookResponseTooLarge):
+        _parse_json(resp)
+    assert body.tell() == 0
+
+
+def test_streamed_body_is_cut_off_past_the_limit(monkeypatch):
+    monkeypatch.setattr(webhook, "MAX_RESPONSE_BYTES", 100)
+    _parse_json(response(json.dumps({"result": "x" * 80}).encode(), "application/json"))
+    with pytest.raises(WebhookResponseTooLarge):
+        _parse_json(response(json.dumps({"result": "x" * 200}).encode(), "application/json"))
+    with pytest.raises(WebhookResponseTooLarge):
+        _read_chunks(response(b"x" * 200, "text/plain", chunk_size=10), lambda text: None)
+
+
+def test_limit_applies_to_the_decompressed_body(monkeypatch):
+    monkeypatch.setattr(webhook, "MAX_RESPONSE_BYTES", 1000)
+    body = gzip.compress(json.dumps({"result": "x" * 5000}).encode())
+    assert len(body) < 1000
+    resp = response(body, "application/json", headers={"Content-Encoding": "gzip", "Content-Length": str(len(body))})
+    with pytest.raises(WebhookResponseTooLarge):
+        _parse_json(resp)
@@ -0,0 +1,67 @@
+import logging
+import os
+import threading
+
+from webhook import fetch_analysis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 6 * 60 * 60
+
+
+def warmup_enabled():
+    """Preset warm-up is opt-in via SLEEP_WARMUP=1."""
+    return os.environ.get("SLEEP_WARMUP", "").lower() in ("1", "true", "yes")
+
+
+class PresetWarmer:
+    """Background thread that keeps the preset analyses in the result cache.
+
+    On start it fills in presets missing from the cache, then refreshes every
+    preset each ``interval`` seconds so cached entries never go stale.
+    """
+
+    def __init__(self, cache, presets, locale, interval=DEFAULT_REFRESH_INTERVAL, fetch=fetch_analysis):
+        self.cache = cache
+        self.presets = list(presets)
+        self.locale = locale
+        self.interval = interval
+        self.fetch = fetch
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, cache, presets, locale, fetch=fetch_analysis):
+        interval = float(os.environ.get("SLEEP_WARMUP_INTERVAL", DEFAULT_REFRESH_INTERVAL))
+        return cls(cache, presets, locale, interval=interval, fetch=fetch)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="preset-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def warm(self, refresh=False):
+        """Compute and store preset results; returns the number stored."""
+        stored = 0
+        for text in self.presets:
+            if self._stop.is_set():
+                break
+            if not refresh and self.cache.get(text, self.locale) is not None:
+                continue
+            try:
+                data = self.fetch(text)
+            except Exception:
+                logger.warning("Preset warm-up failed for %r", text[:20], exc_info=True)
+                continue
+            self.cache.put(text, self.locale, data)
+            stored += 1
+        return stored
+
+    def _run(self):
+        self.warm()
+        while self.interval > 0 and not self._stop.wait(self.interval):
+            self.warm(refresh=True)
@@ -0,0 +1,366 @@
+import codecs
+import gzip
+import json
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+import metrics
+
+# Analysis webhook endpoint, can be overridden for staging or local testing
+WEBHOOK_URL = os.environ.get(
+    "SLEEP_WEBHOOK_URL",
+    "https://sleep.zeabur.app/webhook/c8f29e8a-3796-43f8-940a-23b061039ff2",
+)
+# Optional second endpoint that hedged requests are sent to instead of repeating the primary
+SECONDARY_WEBHOOK_URL = os.environ.get("SLEEP_WEBHOOK_SECONDARY_URL", "")
+REQUEST_TIMEOUT = 95
+# Responses larger than this (after decompression) are cut off instead of read into memory
+DEFAULT_MAX_RESPONSE_BYTES = 1024 * 1024
+MAX_RESPONSE_BYTES = int(os.environ.get("SLEEP_MAX_RESPONSE_BYTES", DEFAULT_MAX_RESPONSE_BYTES))
+# Request bodies below this size are sent as is; gzip would barely shrink them
+GZIP_MIN_BYTES = 512
+# How much of an unparseable body is echoed back in the error
+PARSE_ERROR_ECHO_BYTES = 500
+# Small reads keep a highly compressed response from expanding far past the limit in one go
+READ_CHUNK_BYTES = 16 * 1024
+
+# Connection pool defaults, overridable via SLEEP_HTTP_* environment variables
+DEFAULT_POOL_SIZE = 20
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+
+class WebhookError(Exception):
+    """Base class for webhook failures that happen after a response arrives."""
+
+
+class WebhookHTTPError(WebhookError):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class WebhookParseError(WebhookError):
+    """``text`` is the start of the body, at most PARSE_ERROR_ECHO_BYTES of it."""
+
+    def __init__(self, text):
+        super().__init__("unparseable response")
+        self.text = text
+
+
+class WebhookResponseTooLarge(WebhookError):
+    def __init__(self, limit):
+        super().__init__(f"response larger than {limit} bytes")
+        self.limit = limit
+
+
+class _TimedConnectMixin:
+    # Records TCP (and TLS) connection setup separately from request latency
+    def connect(self):
+        with metrics.timer("upstream_connect"):
+            super().connect()
+
+
+class _TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools time every new connection they open."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def build_session(pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """Create a keep-alive session with a bounded connection pool.
+
+    Only connection-level failures are retried (with exponential backoff):
+    the POST never reached the server, so retrying cannot duplicate work.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=backoff,
+        raise_on_status=False,
+    )
+    adapter = TimedHTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.headers["Connection"] = "keep-alive"
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def build_session_from_env():
+    return build_session(
+        pool_size=int(os.environ.get("SLEEP_HTTP_POOL_SIZE", DEFAULT_POOL_SIZE)),
+        retries=int(os.environ.get("SLEEP_HTTP_RETRIES", DEFAULT_RETRIES)),
+        backoff=float(os.environ.get("SLEEP_HTTP_BACKOFF", DEFAULT_BACKOFF)),
+    )
+
+
+def pool_stats(session):
+    """Summarize the connection pools held by ``session``, one dict per host."""
+    stats = []
+    seen = set()
+    for adapter in session.adapters.values():
+        if id(adapter) in seen or not isinstance(adapter, HTTPAdapter):
+            continue
+        seen.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            # The pool queue is pre-filled with None slots; only real connections are idle
+            idle = [conn for conn in list(pool.pool.queue) if conn is not None] if pool.pool else []
+            stats.append({
+                "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                "maxsize": pool.pool.maxsize if pool.pool else 0,
+                "idle": len(idle),
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+            })
+    return stats
+
+
+def gzip_requests_mode():
+    """How request bodies are compressed, from SLEEP_GZIP_REQUESTS.
+
+    "auto" (the default) gzips once the upstream has advertised gzip in an
+    ``Accept-Encoding`` response header (RFC 7694), "1" always does, "0"
+    never does. An upstream that answers a gzipped body with 415 gets
+    uncompressed bodies from then on.
+    """
+    mode = os.environ.get("SLEEP_GZIP_REQUESTS", "auto").lower()
+    if mode in ("1", "true", "yes"):
+        return "on"
+    if mode in ("0", "false", "no"):
+        return "off"
+    return "auto"
+
+
+# Per endpoint: whether it takes gzipped request bodies, once known
+_gzip_support = {}
+
+
+def _post(http, url, user_input, headers, timeout):
+    # Sent as UTF-8 rather than \u escapes, which double the size of Chinese descriptions
+    body = json.dumps({"user_input": user_input}, ensure_ascii=False).encode("utf-8")
+    headers = dict(headers, **{"Content-Type": "application/json", "Accept-Encoding": "gzip, deflate"})
+    mode = gzip_requests_mode()
+    compress = mode != "off" and len(body) >= GZIP_MIN_BYTES and _gzip_support.get(url, mode == "on")
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+        metrics.inc("upstream_gzip_requests")
+    response = http.post(url, data=gzip.compress(body) if compress else body, headers=headers,
+                         timeout=timeout, stream=True)
+    if compress and response.status_code == 415:
+        # The upstream does not take gzip after all; resend this one plainly and stop compressing
+        response.close()
+        metrics.inc("upstream_gzip_rejected")
+        _gzip_support[url] = False
+        return _post(http, url, user_input, {k: v for k, v in headers.items() if k != "Content-Encoding"}, timeout)
+    if "gzip" in response.headers.get("Accept-Encoding", "").lower():
+        _gzip_support.setdefault(url, True)
+    return response
+
+
+def fetch_analysis(user_input, timeout=REQUEST_TIMEOUT, session=None, url=None):
+    """POST the user's description to the webhook and return the parsed JSON.
+
+    ``url`` defaults to ``WEBHOOK_URL``. Network failures propagate as ``requests.RequestException``; bad status
+    codes, unparseable bodies and bodies over ``MAX_RESPONSE_BYTES`` raise the matching ``WebhookError``.
+    """
+    http = session if session is not None else requests
+    started = time.perf_counter()
+    try:
+        response = _post(http, url or WEBHOOK_URL, user_input, {}, timeout)
+    except requests.RequestException:
+        metrics.inc("upstream_connection_errors")
+        raise
+    # requests measures elapsed up to the parsed response headers, i.e. time to first byte
+    metrics.observe("upstream_ttfb", response.elapsed.total_seconds())
+
+    with response:
+        if response.status_code != 200:
+            metrics.inc("upstream_http_errors")
+            raise WebhookHTTPError(response.status_code)
+        data = _parse_json(response)
+    metrics.observe("upstream_total", time.perf_counter() - started)
+    return data
+
+
+def _iter_body(response, chunk_size=READ_CHUNK_BYTES):
+    """Yield the decompressed body, raising WebhookResponseTooLarge past ``MAX_RESPONSE_BYTES``."""
+    length = response.headers.get("Content-Length", "")
+    # The declared (possibly compressed) length is a lower bound, so an oversized body is refused unread
+    if length.isdigit() and int(length) > MAX_RESPONSE_BYTES:
+        metrics.inc("upstream_oversized_responses")
+        raise WebhookResponseTooLarge(MAX_RESPONSE_BYTES)
+    received = 0
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        received += len(chunk)
+        if received > MAX_RESPONSE_BYTES:
+            metrics.inc("upstream_oversized_responses")
+            raise WebhookResponseTooLarge(MAX_RESPONSE_BYTES)
+        yield chunk
+    metrics.inc("upstream_body_bytes", received)
+    # Bytes read off the socket, before decompression
+    metrics.inc("upstream_wire_bytes", response.raw.tell())
+
+
+def _charset(response):
+    """The charset the Content-Type declares, else UTF-8.
+
+    Not ``response.encoding``: requests falls back to ISO-8859-1 for any
+    text/* type without a charset, which garbles UTF-8 event streams.
+    """
+    for param in response.headers.get("Content-Type", "").split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset":
+            try:
+                return codecs.lookup(value.strip().strip('"\'')).name
+            except LookupError:
+                break
+    return "utf-8"
+
+
+def _parse_json(response):
+    # Read once into a bounded buffer, then parse once; no second attempt over a text copy
+    body = b"".join(_iter_body(response))
+    with metrics.timer("parse"):
+        try:
+            return json.loads(body.decode(_charset(response)))
+        except ValueError:
+            metrics.inc("upstream_parse_errors")
+            echo = body[:PARSE_ERROR_ECHO_BYTES].decode("utf-8", errors="replace")
+            raise WebhookParseError(echo + ("…" if len(body) > PARSE_ERROR_ECHO_BYTES else ""))
+
+
+def stream_analysis(user_input, on_text, timeout=REQUEST_TIMEOUT, session=None, url=None):
+    """Like ``fetch_analysis`` but renders the result as the webhook sends it.
+
+    ``on_text`` is called with the accumulated result text whenever more of
+    it arrives. Server-sent events (``data:`` lines carrying raw text or JSON
+    with ``delta``/``text``/``result``) and chunked plain text are read
+    incrementally; any other content type falls back to the one-shot JSON
+    contract. Returns the final payload in the same ``{"result": ...}`` shape.
+    """
+    http = session if session is not None else requests
+    started = time.perf_counter()
+    try:
+        response = _post(
+            http, url or WEBHOOK_URL, user_input,
+            {"Accept": "text/event-stream, text/plain;q=0.9, application/json;q=0.8"}, timeout,
+        )
+    except requests.RequestException:
+        metrics.inc("upstream_connection_errors")
+        raise
+
+    metrics.observe("upstream_ttfb", response.elapsed.total_seconds())
+    with response:
+        if response.status_code != 200:
+            metrics.inc("upstream_http_errors")
+            raise WebhookHTTPError(response.status_code)
+
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type == "text/event-stream":
+            text = _read_events(response, on_text)
+        elif content_type == "text/plain":
+            text = _read_chunks(response, on_text)
+        else:
+            data = _parse_json(response)
+            metrics.observe("upstream_total", time.perf_counter() - started)
+            if isinstance(data, dict) and "result" in data:
+                on_text(data["result"])
+            return data
+    metrics.observe("upstream_total", time.perf_counter() - started)
+    return {"result": text}
+
+
+def _iter_text(response):
+    # For chunked responses chunk_size=None yields data as soon as it arrives instead of waiting
+    # for a fixed-size block to fill up; other bodies would be read whole, so they are read in blocks
+    decoder = codecs.getincrementaldecoder(_charset(response))(errors="replace")
+    for chunk in _iter_body(response, chunk_size=None if response.raw.chunked else READ_CHUNK_BYTES):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def _read_chunks(response, on_text):
+    text = ""
+    for chunk in _iter_text(response):
+        text += chunk
+        on_text(text)
+    return text
+
+
+def _read_events(response, on_text):
+    text = ""
+    buffer = ""
+    for chunk in _iter_text(response):
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:]
+            # Only the single space after the colon is framing; the rest of a text delta is content
+            if payload.startswith(" "):
+                payload = payload[1:]
+            if payload == "[DONE]":
+                return text
+            event = payload
+            # Only JSON objects and strings are events; anything else (even "42") is raw text to keep as is
+            if payload.startswith(("{", '"')):
+                try:
+                    event = json.loads(payload)
+                except ValueError:
+                    pass
+            if isinstance(event, dict):
+                if "result" in event:
+                    # A full result replaces whatever was streamed so far
+                    text = str(event["result"])
+                else:
+                    text += str(event.get("delta", event.get("text", "")))
+            else:
+                text += str(event)
+            on_text(text)
+    return text
+
+
+def streaming_enabled():
+    """Streaming result rendering is opt-in via SLEEP_STREAMING=1."""
+    return os.environ.get("SLEEP_STREAMING", "").lower() in ("1", "true", "yes")